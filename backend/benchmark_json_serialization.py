@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark da serialização JSON das respostas - StoryLeaf 2.0
+Compara o caminho antigo (provider padrão do Flask, isoformat por linha e
+json.loads do JSON gravado) com o provider do app e o repasse de JSON cru,
+nos formatos devolvidos pelas listagens
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from src.json_provider import HAS_FRAGMENT, StoryLeafJSONProvider, orjson, raw_json
+from src.models.book import Book
+from src.models.story import Story
+
+
+def summary_rows(count):
+    """Linhas como as da projeção de resumo de GET /stories"""
+    started = datetime(2025, 1, 1)
+    return [
+        (index, f'História {index}', 'fantasia', 'épico', 'jovens', 1,
+         started + timedelta(minutes=index), started + timedelta(hours=index),
+         False, 1200 + index, index, 'creative', 'neutral')
+        for index in range(count)
+    ]
+
+
+def legacy_summary(row):
+    summary = dict(zip(Story.SUMMARY_FIELDS, row))
+    for field in ('created_at', 'updated_at'):
+        summary[field] = summary[field].isoformat() if summary[field] else None
+    return summary
+
+
+def stored_leaves(count):
+    """Folhas como estão gravadas no banco (texto JSON)"""
+    return [json.dumps({
+        'title': f'Capítulo {index}',
+        'summary': 'Uma folha da árvore da história. ' * 8,
+        'tags': ['jornada', 'floresta', 'mistério'],
+        'word_target': 1500
+    }, ensure_ascii=False) for index in range(count)]
+
+
+def books(count):
+    elements = json.dumps([{'type': 'quiz', 'page': page, 'options': ['a', 'b', 'c']} for page in range(10)])
+    markers = json.dumps([{'marker': f'm{page}', 'model': 'arvore.glb'} for page in range(5)])
+    return [Book(id=index, title=f'Livro {index}', author='Autor', genre='fantasia',
+                 description='Descrição do livro. ' * 5, chapters=12, reading_time=90,
+                 interactive_elements=elements, ar_markers=markers) for index in range(count)]
+
+
+def legacy_book(book):
+    data = book.to_dict()
+    data['interactive_elements'] = json.loads(book.interactive_elements) if book.interactive_elements else None
+    data['ar_markers'] = json.loads(book.ar_markers) if book.ar_markers else None
+    return data
+
+
+def scenarios(stories_count, leaves_count, books_count):
+    rows = summary_rows(stories_count)
+    leaves = stored_leaves(leaves_count)
+    book_list = books(books_count)
+    return [
+        (f'GET /stories ({stories_count} resumos)',
+         lambda: {'success': True, 'stories': [legacy_summary(row) for row in rows]},
+         lambda: {'success': True, 'stories': [Story.summary_to_dict(row) for row in rows]}),
+        (f'GET /stories/<id> ({leaves_count} folhas)',
+         lambda: {'success': True, 'leaves': [json.loads(leaf) for leaf in leaves]},
+         lambda: {'success': True, 'leaves': [raw_json(leaf) for leaf in leaves]}),
+        (f'livros ({books_count} com elementos)',
+         lambda: {'success': True, 'books': [legacy_book(book) for book in book_list]},
+         lambda: {'success': True, 'books': [book.to_dict() for book in book_list]}),
+    ]
+
+
+def measure(app, build, repeat):
+    times = []
+    with app.app_context():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = app.json.response(build()).get_data()
+            times.append(time.perf_counter() - started)
+    return statistics.median(times), len(body)
+
+
+def run(stories_count, leaves_count, books_count, repeat):
+    legacy_app = Flask('legacy')
+    legacy_app.json = DefaultJSONProvider(legacy_app)
+    fast_app = Flask('fast')
+    fast_app.json = StoryLeafJSONProvider(fast_app)
+
+    encoder = 'json (biblioteca padrão)'
+    if orjson is not None:
+        encoder = f"orjson {orjson.__version__}" + (' com Fragment' if HAS_FRAGMENT else ' sem Fragment')
+    print(f"Codificador do app: {encoder}")
+    print()
+    print(f"{'resposta':34} {'antes':>10} {'depois':>10} {'ganho':>7} {'bytes':>9}")
+    for name, legacy_build, fast_build in scenarios(stories_count, leaves_count, books_count):
+        before, size = measure(legacy_app, legacy_build, repeat)
+        after, _ = measure(fast_app, fast_build, repeat)
+        print(f"{name:34} {before * 1000:8.2f}ms {after * 1000:8.2f}ms {before / after:6.1f}x {size:9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede a serialização JSON das listagens antes e depois do provider do app')
+    parser.add_argument('--stories', type=int, default=100, help='resumos na página de histórias')
+    parser.add_argument('--leaves', type=int, default=300, help='folhas no detalhe da história')
+    parser.add_argument('--books', type=int, default=200, help='livros na listagem')
+    parser.add_argument('--repeat', type=int, default=50, help='execuções por cenário (mediana)')
+    args = parser.parse_args()
+    run(args.stories, args.leaves, args.books, args.repeat)
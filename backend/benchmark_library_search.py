@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark da busca na biblioteca - StoryLeaf 2.0
+Indexa os livros de processed_books/ num índice temporário e mede o tamanho
+das listas de posições e a latência de buscas simples, frases e NEAR
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.library.store import BookStore
+
+DEFAULT_BOOKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processed_books')
+
+QUERIES = [
+    'alice',
+    'rabbit',
+    'the',
+    '"país das maravilhas"',
+    '"captain hook"',
+    '"once upon a time"',
+    'alice NEAR/5 rabbit',
+    'wendy NEAR hook',
+    '"mad hatter" NEAR/20 alice',
+    'xyzzy'
+]
+
+
+def index_size(store):
+    with store.connect() as conn:
+        postings_count, postings_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(positions)), 0) FROM postings"
+        ).fetchone()
+        token_count, tokens_bytes = conn.execute(
+            "SELECT COALESCE(SUM(token_count), 0), COALESCE(SUM(LENGTH(byte_offsets)), 0) FROM book_tokens"
+        ).fetchone()
+    return postings_count, postings_bytes, token_count, tokens_bytes
+
+
+def measure_query(store, query, repeat):
+    # Fria: cache de posições vazio (lê e decodifica do SQLite); quente: cache cheio
+    store.postings_cache.clear()
+    started = time.perf_counter()
+    result = store.search(query, limit=20)
+    cold = time.perf_counter() - started
+
+    warm_times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        store.search(query, limit=20)
+        warm_times.append(time.perf_counter() - started)
+    return cold, statistics.median(warm_times), result['total_matches'] if result else 0
+
+
+def run(books_dir, repeat):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BookStore(books_dir, os.path.join(temp_dir, 'book_index.db'))
+
+        started = time.perf_counter()
+        book_ids = store.list_book_ids()
+        for book_id in book_ids:
+            store.get_book(book_id)
+        build_seconds = time.perf_counter() - started
+
+        postings_count, postings_bytes, token_count, tokens_bytes = index_size(store)
+        raw_bytes = token_count * 4
+        print(f"{len(book_ids)} livros, {token_count} tokens, {postings_count} listas de posições")
+        print(f"Indexação: {build_seconds:.2f}s")
+        print(f"Posições:  {postings_bytes / 1e6:.2f} MB em varint (vs {raw_bytes / 1e6:.2f} MB em uint32, "
+              f"{postings_bytes / raw_bytes:.0%})" if raw_bytes else "Posições: índice vazio")
+        print(f"Offsets:   {tokens_bytes / 1e6:.2f} MB em varint (vs {raw_bytes / 1e6:.2f} MB em uint32)")
+        print(f"Arquivo:   {os.path.getsize(store.index_path) / 1e6:.2f} MB")
+        print()
+
+        print(f"{'busca':32} {'acertos':>8} {'fria':>10} {'quente':>10}")
+        for query in QUERIES:
+            cold, warm, matches = measure_query(store, query, repeat)
+            print(f"{query:32} {matches:8} {cold * 1000:8.2f}ms {warm * 1000:8.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede tamanho do índice e latência da busca na biblioteca')
+    parser.add_argument('books_dir', nargs='?', default=DEFAULT_BOOKS_DIR)
+    parser.add_argument('--repeat', type=int, default=20, help='execuções quentes por busca (mediana)')
+    args = parser.parse_args()
+    run(args.books_dir, args.repeat)
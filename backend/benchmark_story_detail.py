@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Consultas SQL do detalhe da história - StoryLeaf 2.0
+Cria histórias com números diferentes de personagens e versões num banco
+temporário e conta os comandos SQL e o tempo de carregar o detalhe pelas três
+requisições antigas (/stories/<id>, /characters, /versions) e por
+/stories/<id>/detail. O detalhe precisa ficar com o mesmo número de
+consultas, seja qual for o tamanho da história; se não ficar, o script
+termina com erro
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+INCLUDE = 'characters,versions_meta,branches,leaves'
+
+
+def create_story(client, characters, versions):
+    story = client.post('/api/stories', json={
+        'title': f'História com {characters} personagens',
+        'content': 'Era uma vez',
+        'branches': [{'name': f'galho {index}'} for index in range(3)],
+        'leaves': [{'title': f'Capítulo {index}'} for index in range(5)]
+    }).get_json()['story']
+    for index in range(characters):
+        client.post(f"/api/stories/{story['id']}/characters", json={'name': f'Personagem {index}'})
+    for index in range(versions):
+        client.put(f"/api/stories/{story['id']}", json={'content': f'Era uma vez, versão {index}'})
+    return story['id']
+
+
+def measure(app, engine, requests):
+    from sqlalchemy import event
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = app.test_client()
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        started = time.perf_counter()
+        for url in requests:
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.get_json())
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements), elapsed
+
+
+def run(sizes):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # O banco precisa ser escolhido antes de importar o app
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(temp_dir, 'app.db')}"
+        from src.main import app, db
+
+        client = app.test_client()
+        with app.app_context():
+            engine = db.engine
+
+        print(f"{'personagens/versões':>20} {'antes':>8} {'detalhe':>8} {'tempo antes':>12} {'tempo detalhe':>14}")
+        detail_counts = set()
+        for size in sizes:
+            story_id = create_story(client, size, size)
+            old_count, old_time = measure(app, engine, [
+                f'/api/stories/{story_id}',
+                f'/api/stories/{story_id}/characters',
+                f'/api/stories/{story_id}/versions'
+            ])
+            detail_count, detail_time = measure(app, engine, [f'/api/stories/{story_id}/detail?include={INCLUDE}'])
+            detail_counts.add(detail_count)
+            print(f"{size:>20} {old_count:>8} {detail_count:>8} {old_time * 1000:10.2f}ms {detail_time * 1000:12.2f}ms")
+
+        if len(detail_counts) != 1:
+            sys.exit(f"O detalhe não tem número fixo de consultas: {sorted(detail_counts)}")
+        print(f"\nDetalhe com {detail_counts.pop()} consultas em todos os tamanhos")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Conta as consultas SQL do detalhe da história')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100], help='personagens e versões por história')
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do banco da aplicação - StoryLeaf 2.0
+Roda leitores (página de histórias) e escritores (salvamentos) em threads
+contra um SQLite temporário, com a configuração padrão (rollback journal,
+synchronous FULL) e com a de models/database.py (WAL e pragmas), e mostra
+a vazão de cada lado. Com --url, mede só a configuração do app nessa URL.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from src.models.database import engine_options, install_sqlite_pragmas
+
+SCHEMA = [
+    "DROP TABLE IF EXISTS load_stories",
+    "CREATE TABLE load_stories (id INTEGER PRIMARY KEY, title VARCHAR(200), content TEXT, "
+    "word_count INTEGER, updated_at TIMESTAMP)",
+    "CREATE INDEX ix_load_stories_updated_at ON load_stories (updated_at, id)"
+]
+
+PAGE_QUERY = text(
+    "SELECT id, title, word_count, updated_at FROM load_stories ORDER BY updated_at DESC, id DESC LIMIT 20"
+)
+SAVE_QUERY = text(
+    "UPDATE load_stories SET content = :content, word_count = :word_count, updated_at = :updated_at WHERE id = :id"
+)
+
+
+def prepare(engine, rows):
+    content = 'Era uma vez uma árvore que contava histórias. ' * 200
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(
+            text("INSERT INTO load_stories (id, title, content, word_count, updated_at) "
+                 "VALUES (:id, :title, :content, :word_count, :updated_at)"),
+            [{"id": index, "title": f"História {index}", "content": content,
+              "word_count": 1600, "updated_at": time.time()} for index in range(1, rows + 1)]
+        )
+
+
+def worker(engine, kind, rows, deadline, results):
+    operations = errors = 0
+    latencies = []
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if kind == 'read':
+                with engine.connect() as conn:
+                    conn.execute(PAGE_QUERY).fetchall()
+            else:
+                with engine.begin() as conn:
+                    conn.execute(SAVE_QUERY, {
+                        "id": rng.randint(1, rows),
+                        "content": 'Texto salvo. ' * rng.randint(100, 800),
+                        "word_count": rng.randint(200, 1600),
+                        "updated_at": time.time()
+                    })
+            operations += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            # "database is locked" depois do timeout de espera
+            errors += 1
+    results.append((kind, operations, errors, latencies))
+
+
+def run_load(engine, readers, writers, rows, seconds):
+    prepare(engine, rows)
+    results = []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=worker, args=(engine, 'read', rows, deadline, results)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=(engine, 'write', rows, deadline, results)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = {}
+    for kind in ('read', 'write'):
+        operations = sum(result[1] for result in results if result[0] == kind)
+        errors = sum(result[2] for result in results if result[0] == kind)
+        latencies = sorted(latency for result in results if result[0] == kind for latency in result[3])
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        summary[kind] = (operations / seconds, errors, statistics.median(latencies) if latencies else 0, p95)
+    return summary
+
+
+def print_summary(name, summary):
+    for kind, label in (('read', 'leituras'), ('write', 'escritas')):
+        per_second, errors, median, p95 = summary[kind]
+        print(f"{name:10} {label:9} {per_second:9.0f}/s {median * 1000:8.2f}ms {p95 * 1000:8.2f}ms {errors:6}")
+
+
+def baseline_engine(url):
+    engine = create_engine(url, connect_args={'check_same_thread': False, 'timeout': 5})
+    install_sqlite_pragmas(engine, ["PRAGMA journal_mode = DELETE", "PRAGMA synchronous = FULL"])
+    return engine
+
+
+def tuned_engine(url):
+    engine = create_engine(url, **engine_options(url))
+    install_sqlite_pragmas(engine)
+    return engine
+
+
+def run(args):
+    print(f"{args.readers} leitores, {args.writers} escritores, {args.seconds}s por configuração")
+    print(f"{'config':10} {'operação':9} {'vazão':>11} {'mediana':>10} {'p95':>10} {'erros':>6}")
+
+    if args.url:
+        engine = tuned_engine(args.url)
+        print_summary('app', run_load(engine, args.readers, args.writers, args.rows, args.seconds))
+        engine.dispose()
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, factory in (('padrão', baseline_engine), ('ajustado', tuned_engine)):
+            url = f"sqlite:///{os.path.join(temp_dir, f'{name}.db')}"
+            engine = factory(url)
+            print_summary(name, run_load(engine, args.readers, args.writers, args.rows, args.seconds))
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede vazão de leituras e escritas simultâneas no banco do app')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=500, help='histórias criadas antes do teste')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--url', help='mede só a configuração do app neste banco (a tabela load_stories é recriada)')
+    run(parser.parse_args())
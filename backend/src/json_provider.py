@@ -0,0 +1,105 @@
+"""
+Serialização JSON das respostas da API - StoryLeaf 2.0
+Usa o orjson quando ele está instalado (bem mais rápido que o json da
+biblioteca padrão) e cai para o provider padrão do Flask quando não está.
+Datas saem sempre em ISO 8601, e JSON já gravado no banco pode ser
+repassado sem ser decodificado (RawJSON)
+"""
+
+import dataclasses
+import decimal
+import json
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson >= 3.9 insere fragmentos de JSON pronto direto na saída
+HAS_FRAGMENT = orjson is not None and hasattr(orjson, 'Fragment')
+
+
+class RawJSON:
+    """Texto JSON já serializado, para ser embutido na resposta como está"""
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f'RawJSON({self.text!r})'
+
+
+def raw_json(text):
+    """
+    Embrulha um texto JSON vindo do banco para a resposta
+
+    Com orjson.Fragment o texto é copiado direto para a saída; sem ele, é
+    decodificado só na hora de serializar.
+    """
+    if text is None:
+        return None
+    if HAS_FRAGMENT:
+        return orjson.Fragment(text)
+    return RawJSON(text)
+
+
+def default(obj):
+    """Tipos que nenhum dos codificadores conhece"""
+    if isinstance(obj, RawJSON):
+        return orjson.loads(obj.text) if orjson is not None else json.loads(obj.text)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class StoryLeafJSONProvider(DefaultJSONProvider):
+    """
+    Provider JSON do app: orjson quando disponível, json padrão caso contrário
+
+    Mantém o comportamento do provider do Flask (chaves ordenadas,
+    indentação em modo debug), exceto pelas datas, que saem em ISO 8601 em
+    vez do formato HTTP.
+    """
+
+    @staticmethod
+    def default(obj):
+        return default(obj)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'sort_keys', 'indent'}:
+            return super().dumps(obj, **kwargs)
+        return self._orjson_dumps(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        # Mesmo que DefaultJSONProvider.response, mas sem passar por str
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = None
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            indent = 2
+        body = self._orjson_dumps(obj, sort_keys=self.sort_keys, indent=indent) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def _orjson_dumps(self, obj, sort_keys=None, indent=None):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys if sort_keys is not None else self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
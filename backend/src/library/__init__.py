@@ -0,0 +1,4 @@
+"""
+Biblioteca de livros processados - StoryLeaf 2.0
+Camada compartilhada de indexação e leitura usada pelas rotas de livros e audiobook
+"""
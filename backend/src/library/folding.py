@@ -0,0 +1,47 @@
+"""
+Dobra de texto para busca sem acentos - StoryLeaf 2.0
+Minúsculas e sem acentos, caractere por caractere, para que o texto dobrado
+tenha os mesmos offsets de caractere do texto original
+"""
+
+import unicodedata
+
+
+class FoldTable(dict):
+    """
+    Tabela de str.translate que troca cada caractere por exatamente um caractere
+
+    Usa a letra base da decomposição NFKD em minúsculas ("Á" -> "a"). O
+    resultado de cada caractere é calculado na primeira vez e guardado.
+    """
+
+    def __missing__(self, codepoint):
+        character = chr(codepoint)
+        base = unicodedata.normalize('NFKD', character)[:1] or character
+        folded = base.lower()
+        # Alguns caracteres viram dois em minúsculas ("İ"); aí fica a base
+        if len(folded) != 1:
+            folded = base
+        self[codepoint] = folded
+        return folded
+
+
+FOLD_TABLE = FoldTable()
+
+
+def fold_text(text):
+    """
+    Dobra o texto mantendo o comprimento (e portanto os offsets) intacto
+    """
+    if text.isascii():
+        return text.lower()
+    return text.translate(FOLD_TABLE)
+
+
+def fold_query(query):
+    """
+    Dobra um termo de busca e junta espaços repetidos, como no texto limpo
+
+    O termo é composto (NFC) antes, como os livros gravados pela ingestão.
+    """
+    return ' '.join(fold_text(unicodedata.normalize('NFC', query)).split())
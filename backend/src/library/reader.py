@@ -0,0 +1,87 @@
+"""
+Leitor mapeado em memória dos livros processados - StoryLeaf 2.0
+Lê faixas de bytes via mmap, sem decodificar o arquivo inteiro
+"""
+
+import codecs
+import hashlib
+import mmap
+import os
+
+# Tamanho máximo de um caractere em UTF-8
+MAX_UTF8_CHAR_BYTES = 4
+
+# Tamanho dos blocos decodificados ao percorrer o livro inteiro
+READ_CHUNK_SIZE = 1 << 20
+
+
+class MappedBook:
+    """
+    Arquivo de livro mapeado em memória (somente leitura)
+
+    As leituras copiam apenas a faixa pedida do page cache e a decodificam.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # Arquivos vazios não podem ser mapeados
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def read(self, byte_start=0, byte_end=None):
+        """
+        Decodifica a faixa [byte_start, byte_end) do arquivo
+        """
+        if self._map is None:
+            return ''
+        if byte_end is None or byte_end > self.size:
+            byte_end = self.size
+        return self._map[byte_start:byte_end].decode('utf-8')
+
+    def read_chars(self, byte_start, max_chars, byte_end=None):
+        """
+        Decodifica no máximo max_chars caracteres a partir de byte_start
+
+        Lê apenas max_chars * 4 bytes e recua o corte até o início de um caractere.
+        """
+        if self._map is None:
+            return ''
+        if byte_end is None or byte_end > self.size:
+            byte_end = self.size
+        stop = min(byte_end, byte_start + max_chars * MAX_UTF8_CHAR_BYTES)
+
+        # Não corta um caractere multibyte ao meio (bytes 10xxxxxx são continuação)
+        while byte_start < stop < self.size and self._map[stop] & 0xC0 == 0x80:
+            stop -= 1
+
+        return self._map[byte_start:stop].decode('utf-8')[:max_chars]
+
+    @property
+    def buffer(self):
+        """
+        Bytes do arquivo sem cópia (aceito por hashlib e por regex de bytes)
+        """
+        return self._map if self._map is not None else b''
+
+    def sha256(self):
+        return hashlib.sha256(self.buffer).hexdigest()
+
+    def iter_text(self, chunk_size=READ_CHUNK_SIZE):
+        """
+        Decodifica o arquivo em blocos, sem montar o texto inteiro
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for block_start in range(0, self.size, chunk_size):
+            yield decoder.decode(self._map[block_start:block_start + chunk_size])
+        yield decoder.decode(b'', final=True)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
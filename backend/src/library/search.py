@@ -0,0 +1,249 @@
+"""
+Busca de texto completo nos livros processados - StoryLeaf 2.0
+Índice invertido posicional gravado no índice dos livros: para cada termo
+dobrado, as posições (número do token) em cada livro, e para cada livro o
+offset em bytes de cada token. As listas são gravadas como deltas em
+bytes variáveis (varint).
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from src.library.folding import fold_query
+
+WORD = re.compile(r'\w+')
+
+# Frases entre aspas, operadores NEAR (NEAR ou NEAR/k, em maiúsculas) e palavras soltas
+QUERY_TOKEN = re.compile(r'"([^"]*)"|\bNEAR(?:/(\d+))?\b|([^\s"]+)')
+
+# Distância máxima (em palavras entre os dois lados) de um NEAR sem /k
+DEFAULT_NEAR_DISTANCE = 10
+MAX_NEAR_DISTANCE = 100
+
+# Bytes de contexto de cada lado do acerto no trecho devolvido
+SNIPPET_CONTEXT_BYTES = 160
+
+# Maior token considerado ao medir o fim de um acerto
+MAX_TOKEN_BYTES = 256
+
+
+def iter_tokens(paragraphs):
+    """
+    Produz (termo dobrado, byte_start) de cada palavra dos parágrafos
+
+    `paragraphs` são (byte_start, texto, chave de busca). Como a chave tem os
+    mesmos offsets de caractere do texto, a palavra é achada na chave e o
+    offset em bytes é medido no texto, avançando de forma incremental.
+    """
+    for byte_start, display, search_key in paragraphs:
+        char_position = 0
+        byte_position = byte_start
+        for match in WORD.finditer(search_key):
+            byte_position += len(display[char_position:match.start()].encode('utf-8'))
+            char_position = match.start()
+            yield match.group(), byte_position
+
+
+def build_positional_index(tokens):
+    """
+    Monta {termo: array de posições} e o array de offsets em bytes por posição
+    """
+    postings = {}
+    byte_offsets = array('I')
+    for position, (term, byte_start) in enumerate(tokens):
+        byte_offsets.append(byte_start)
+        positions = postings.get(term)
+        if positions is None:
+            positions = postings[term] = array('I')
+        positions.append(position)
+    return postings, byte_offsets
+
+
+def encode_positions(positions):
+    """
+    Codifica uma lista crescente como deltas em varint (7 bits por byte)
+
+    Termos frequentes têm deltas pequenos, que cabem em um byte em vez de quatro.
+    """
+    data = bytearray()
+    previous = 0
+    for position in positions:
+        delta = position - previous
+        previous = position
+        while delta >= 0x80:
+            data.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return bytes(data)
+
+
+def decode_positions(data):
+    positions = array('I')
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            previous += value
+            positions.append(previous)
+            value = shift = 0
+    return positions
+
+
+def parse_query(query):
+    """
+    Separa a busca em frases ligadas por NEAR
+
+    Retorna (frases, distâncias): cada frase é a lista de termos dobrados e
+    distances[i] é a distância do NEAR entre as frases i e i + 1. Palavras
+    sem NEAR entre elas formam uma frase, com ou sem aspas:
+    "país das maravilhas", alice NEAR/5 coelho. Frases vazias são ignoradas.
+    """
+    phrases = [[]]
+    distances = []
+    for match in QUERY_TOKEN.finditer(query):
+        quoted, near_distance, word = match.groups()
+        if quoted is None and word is None:
+            if phrases[-1]:
+                distance = int(near_distance) if near_distance else DEFAULT_NEAR_DISTANCE
+                distances.append(min(distance, MAX_NEAR_DISTANCE))
+                phrases.append([])
+            continue
+        phrases[-1].extend(WORD.findall(fold_query(quoted if quoted is not None else word)))
+
+    if not phrases[-1]:
+        phrases.pop()
+        distances = distances[:len(phrases) - 1]
+    return phrases, distances
+
+
+def query_terms(query):
+    """
+    Termos dobrados da busca, na ordem ("Capitão Gancho" -> ["capitao", "gancho"])
+    """
+    phrases, _ = parse_query(query)
+    return [term for phrase in phrases for term in phrase]
+
+
+def match_phrase(term_positions):
+    """
+    Posições iniciais onde os termos aparecem em sequência
+
+    `term_positions` é a lista de arrays de posições de cada termo, na ordem
+    da frase. Parte do termo mais raro e testa os demais por conjunto.
+    """
+    if not term_positions:
+        return []
+    rarest = min(range(len(term_positions)), key=lambda index: len(term_positions[index]))
+    starts = [position - rarest for position in term_positions[rarest] if position >= rarest]
+    for offset, positions in enumerate(term_positions):
+        if offset == rarest or not starts:
+            continue
+        present = set(positions)
+        starts = [start for start in starts if start + offset in present]
+    return starts
+
+
+def match_near(left_spans, right_spans, distance):
+    """
+    Junta as ocorrências dos dois lados com no máximo `distance` palavras entre elas
+
+    Os spans são (primeira posição, última posição), em ordem. Para cada
+    ocorrência da esquerda fica a mais próxima da direita, em qualquer ordem;
+    o resultado cobre as duas.
+    """
+    if not left_spans or not right_spans:
+        return []
+    right_starts = [start for start, _ in right_spans]
+    longest_right = max(end - start for start, end in right_spans)
+
+    spans = set()
+    for left_start, left_end in left_spans:
+        low = bisect_left(right_starts, left_start - distance - 1 - longest_right)
+        high = bisect_right(right_starts, left_end + distance + 1)
+        best = None
+        for right_start, right_end in right_spans[low:high]:
+            if right_end < left_start:
+                gap = left_start - right_end - 1
+            elif right_start > left_end:
+                gap = right_start - left_end - 1
+            else:
+                continue
+            if gap <= distance and (best is None or gap < best[0]):
+                best = (gap, right_start, right_end)
+        if best is not None:
+            spans.add((min(left_start, best[1]), max(left_end, best[2])))
+    return sorted(spans)
+
+
+def match_query(phrases, distances, postings):
+    """
+    Spans (primeira, última posição) onde a busca casa, a partir de {termo: posições}
+    """
+    spans = None
+    for index, phrase in enumerate(phrases):
+        lists = [postings.get(term) for term in phrase]
+        if any(positions is None for positions in lists):
+            return []
+        phrase_spans = [(start, start + len(phrase) - 1) for start in match_phrase(lists)]
+        spans = phrase_spans if spans is None else match_near(spans, phrase_spans, distances[index - 1])
+        if not spans:
+            return []
+    return spans or []
+
+
+def token_end(buffer, byte_start):
+    """
+    Fim em bytes da palavra que começa em byte_start
+    """
+    window = buffer[byte_start:byte_start + MAX_TOKEN_BYTES].decode('utf-8', 'ignore')
+    match = WORD.match(window)
+    return byte_start + len(match.group().encode('utf-8')) if match else byte_start
+
+
+def build_snippet(buffer, hit_start, hit_end, lower_bound, upper_bound):
+    """
+    Trecho ao redor do acerto, com o acerto entre <mark> e cortado em espaços
+    """
+    start = max(lower_bound, hit_start - SNIPPET_CONTEXT_BYTES)
+    end = min(upper_bound, hit_end + SNIPPET_CONTEXT_BYTES)
+    before = buffer[start:hit_start].decode('utf-8', 'ignore')
+    match = buffer[hit_start:hit_end].decode('utf-8')
+    after = buffer[hit_end:end].decode('utf-8', 'ignore')
+
+    if start > lower_bound and ' ' in before:
+        before = '…' + before[before.index(' ') + 1:]
+    if end < upper_bound and ' ' in after:
+        after = after[:after.rindex(' ')] + '…'
+    return f"{before}<mark>{match}</mark>{after}"
+
+
+def locate_hits(mapped, sections, byte_offsets, spans):
+    """
+    Converte spans de acerto em seção, offsets de caractere na seção e trecho
+
+    `sections` são as seções indexadas do livro, em ordem.
+    """
+    section_starts = [section["byte_start"] for section in sections]
+    buffer = mapped.buffer
+    hits = []
+    for first, last in spans:
+        hit_start = byte_offsets[first]
+        hit_end = token_end(buffer, byte_offsets[last])
+        section = sections[max(bisect_right(section_starts, hit_start) - 1, 0)]
+
+        # Offsets em caracteres dentro do texto da seção (como /sections/<id> devolve)
+        char_start = len(bytes(buffer[section["byte_start"]:hit_start]).decode('utf-8'))
+        char_end = char_start + len(buffer[hit_start:hit_end].decode('utf-8'))
+        hits.append({
+            "section_id": section["section_id"],
+            "section_title": section["title"],
+            "char_start": char_start,
+            "char_end": char_end,
+            "byte_start": hit_start,
+            "byte_end": hit_end,
+            "snippet": build_snippet(buffer, hit_start, hit_end, section["byte_start"], section["byte_end"])
+        })
+    return hits
+
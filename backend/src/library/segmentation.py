@@ -0,0 +1,204 @@
+"""
+Segmentação dos livros em parágrafos, capítulos e seções - StoryLeaf 2.0
+Motor único, baseado em geradores, usado pela biblioteca e pelo audiobook
+"""
+
+import re
+from bisect import bisect_right
+
+PARAGRAPH_SEPARATOR = '\n\n'
+SEPARATOR_BYTES = len(PARAGRAPH_SEPARATOR.encode('utf-8'))
+
+# Parágrafos maiores que isso são quebrados em fins de frase. Os livros
+# processados costumam ser uma única linha, que sem isso viraria uma só seção.
+MAX_UNIT_WORDS = 120
+
+# Fim de frase seguido de espaço (o corte fica depois do espaço)
+SENTENCE_END = re.compile(rb'[.!?;:]+["\')\]]*\s+')
+
+# Cabeçalhos de capítulo no texto já normalizado ("chapter iv.", "capítulo 12")
+CHAPTER_HEADING = re.compile(
+    rb'\b(chapter|cap(?:i|\xc3\xad|\xc3\x8d)tulo)\s+'
+    rb'((?=[mdclxvi])m*(?:c[md]|d?c{0,3})(?:x[cl]|l?x{0,3})(?:i[xv]|v?i{0,3})|\d{1,3})\b(\.?)',
+    re.IGNORECASE
+)
+
+# Cabeçalhos mais próximos que isso são um sumário, não capítulos
+MIN_CHAPTER_BYTES = 1000
+
+
+def detect_chapters(data):
+    """
+    Procura cabeçalhos de capítulo em bytes UTF-8 e retorna (byte_start, título)
+
+    Funciona direto sobre um mmap. Cabeçalhos muito próximos de outro (como
+    num sumário) são descartados.
+    """
+    matches = [match for match in CHAPTER_HEADING.finditer(data) if match.group(2)]
+
+    # Se a maioria dos cabeçalhos termina em ponto ("chapter iv."), os sem ponto
+    # são citações no meio do texto ("em chapter iii vimos...")
+    dotted = [match for match in matches if match.group(3)]
+    if len(dotted) * 2 >= len(matches):
+        matches = dotted
+
+    headings = [
+        (match.start(), f"{match.group(1).decode('utf-8').capitalize()} {match.group(2).decode('ascii').upper()}")
+        for match in matches
+    ]
+
+    # Cabeçalhos próximos formam um grupo (sumário). O último do grupo só é um
+    # capítulo de verdade se repetir o primeiro número ("... chapter xii. chapter i.")
+    chapters = []
+    group = []
+    for heading in headings + [None]:
+        if group and (heading is None or heading[0] - group[-1][0] >= MIN_CHAPTER_BYTES):
+            if len(group) == 1 or group[-1][1] == group[0][1]:
+                chapters.append(group[-1])
+            group = []
+        if heading is not None:
+            group.append(heading)
+    return chapters
+
+
+def iter_paragraphs(chunks, breaks=(), max_words=MAX_UNIT_WORDS):
+    """
+    Percorre o texto uma única vez e produz (byte_start, byte_end, palavras) por parágrafo
+
+    `chunks` pode ser uma string ou um iterável de blocos de texto; apenas o
+    parágrafo corrente fica em memória. Os limites são offsets em bytes UTF-8.
+    Parágrafos com mais de max_words palavras são quebrados em fins de frase, e
+    toda posição em `breaks` (início de capítulo) inicia uma nova unidade.
+    """
+    if isinstance(chunks, str):
+        chunks = (chunks,)
+    breaks = sorted(breaks)
+    next_break = 0
+
+    def emit(paragraph, start):
+        nonlocal next_break
+        data = paragraph.encode('utf-8')
+        end = start + len(data)
+        words = len(paragraph.split())
+
+        while next_break < len(breaks) and breaks[next_break] <= start:
+            next_break += 1
+        inner = []
+        while next_break < len(breaks) and breaks[next_break] < end:
+            inner.append(breaks[next_break] - start)
+            next_break += 1
+
+        if words <= max_words and not inner:
+            return [(start, end, words)], end
+        return split_paragraph(data, start, inner, max_words), end
+
+    pending = ''
+    offset = 0
+    for chunk in chunks:
+        # Uma linha em branco nova pode começar no último caractere pendente
+        search_from = max(len(pending) - 1, 0)
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(PARAGRAPH_SEPARATOR, search_from)
+            if end < 0:
+                break
+            units, offset = emit(pending[start:end], offset)
+            yield from units
+            offset += SEPARATOR_BYTES
+            start = search_from = end + len(PARAGRAPH_SEPARATOR)
+        pending = pending[start:]
+
+    units, _ = emit(pending, offset)
+    yield from units
+
+
+def split_paragraph(data, offset, mandatory, max_words):
+    """
+    Quebra um parágrafo (bytes) em unidades de até max_words palavras, em fins de frase
+
+    `mandatory` são posições relativas onde sempre há corte. Uma frase maior
+    que o limite fica inteira numa unidade.
+    """
+    mandatory = set(mandatory)
+    cuts = sorted(mandatory.union(match.end() for match in SENTENCE_END.finditer(data)))
+    cuts = [cut for cut in cuts if 0 < cut < len(data)]
+    cuts.append(len(data))
+
+    units = []
+    piece_start = previous = 0
+    piece_words = 0
+    for cut in cuts:
+        segment_words = len(data[previous:cut].decode('utf-8').split())
+        if previous > piece_start and (
+            previous in mandatory or (piece_words and piece_words + segment_words > max_words)
+        ):
+            units.append((offset + piece_start, offset + previous, piece_words))
+            piece_start = previous
+            piece_words = 0
+        piece_words += segment_words
+        previous = cut
+
+    units.append((offset + piece_start, offset + len(data), piece_words))
+    return units
+
+
+def iter_sections(paragraphs, words_per_section, breaks=()):
+    """
+    Agrupa parágrafos contíguos em seções de até words_per_section palavras, sob demanda
+
+    Produz (byte_start, byte_end, palavras); como os parágrafos são contíguos,
+    cada seção é uma faixa do arquivo. Uma seção nunca atravessa uma posição de
+    `breaks`, e um parágrafo maior que o limite forma uma seção sozinho.
+    """
+    breaks = iter(sorted(breaks))
+    next_break = next(breaks, None)
+    section_start = section_end = 0
+    section_words = 0
+    has_paragraphs = False
+
+    for start, end, words in paragraphs:
+        at_break = False
+        while next_break is not None and next_break <= start:
+            at_break = True
+            next_break = next(breaks, None)
+
+        if has_paragraphs and (at_break or section_words + words > words_per_section):
+            yield section_start, section_end, section_words
+            section_start = start
+            section_words = 0
+
+        section_words += words
+        section_end = end
+        has_paragraphs = True
+
+    # Última seção
+    if has_paragraphs:
+        yield section_start, section_end, section_words
+
+
+def label_sections(sections, chapters):
+    """
+    Dá títulos às seções a partir dos capítulos (byte_start, título) em que começam
+
+    Seções fora de capítulos ficam "Seção N"; capítulos com várias seções
+    numeram as partes.
+    """
+    chapter_starts = [start for start, _ in chapters]
+    owners = [bisect_right(chapter_starts, start) - 1 for start, _, _ in sections]
+    parts_per_chapter = {}
+    for owner in owners:
+        parts_per_chapter[owner] = parts_per_chapter.get(owner, 0) + 1
+
+    titles = []
+    seen = {}
+    for section_id, owner in enumerate(owners, 1):
+        if owner < 0:
+            titles.append(f"Seção {section_id}")
+            continue
+        seen[owner] = seen.get(owner, 0) + 1
+        title = chapters[owner][1]
+        if parts_per_chapter[owner] > 1:
+            title = f"{title} (parte {seen[owner]})"
+        titles.append(title)
+    return titles
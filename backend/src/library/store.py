@@ -0,0 +1,503 @@
+"""
+Índice persistente dos livros processados - StoryLeaf 2.0
+Guarda limites de seções, contagem de palavras e tempo de leitura em SQLite,
+para que os endpoints da biblioteca façam apenas consultas e leituras por faixa de bytes
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from src.cache import LRUCache
+from src.library.folding import fold_text
+from src.library.reader import MappedBook
+from src.library.search import (
+    build_positional_index, decode_positions, encode_positions, iter_tokens, locate_hits, match_query, parse_query
+)
+from src.library.segmentation import detect_chapters, iter_paragraphs, iter_sections, label_sections
+
+# Diretório onde estão os livros processados
+PROCESSED_BOOKS_DIR = os.getenv('PROCESSED_BOOKS_DIR', '/home/ubuntu/StoryLeaf/processed_books')
+
+# Banco do índice, ao lado de processed_books/
+BOOK_INDEX_PATH = os.getenv(
+    'BOOK_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(PROCESSED_BOOKS_DIR)), 'book_index.db')
+)
+
+# Orçamento do cache de livros em memória (bytes) e validade das entradas
+BOOK_CACHE_MAX_BYTES = int(os.getenv('BOOK_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+BOOK_CACHE_TTL_SECONDS = int(os.getenv('BOOK_CACHE_TTL_SECONDS', 3600))
+
+# Orçamento das listas de posições carregadas pela busca
+POSTINGS_CACHE_MAX_BYTES = int(os.getenv('POSTINGS_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+WORDS_PER_SECTION = 500
+WORDS_PER_MINUTE = 200
+
+# Incrementar sempre que a forma de indexar mudar, para forçar reindexação.
+# Também versiona o esquema: um índice de outra versão é recriado do zero.
+INDEX_VERSION = 7
+
+# Índice de capítulos gravado pela ingestão ao lado do livro (<book_id>.chapters.json)
+CHAPTER_INDEX_SUFFIX = '.chapters.json'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    book_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    index_version INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    reading_time_minutes INTEGER NOT NULL,
+    section_count INTEGER NOT NULL,
+    indexed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    book_id TEXT NOT NULL,
+    section_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    byte_start INTEGER NOT NULL,
+    byte_end INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    PRIMARY KEY (book_id, section_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS paragraphs (
+    book_id TEXT NOT NULL,
+    paragraph_id INTEGER NOT NULL,
+    byte_start INTEGER NOT NULL,
+    byte_end INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    PRIMARY KEY (book_id, paragraph_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chapters (
+    book_id TEXT NOT NULL,
+    chapter_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    byte_start INTEGER NOT NULL,
+    byte_end INTEGER NOT NULL,
+    PRIMARY KEY (book_id, chapter_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    book_id TEXT NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term, book_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_book ON postings (book_id);
+CREATE TABLE IF NOT EXISTS book_tokens (
+    book_id TEXT PRIMARY KEY,
+    token_count INTEGER NOT NULL,
+    byte_offsets BLOB NOT NULL
+);
+"""
+
+
+def estimate_reading_time(word_count):
+    """
+    Estima o tempo de leitura em minutos (assumindo 200 palavras por minuto)
+    """
+    return max(1, word_count // WORDS_PER_MINUTE)
+
+
+def file_sha256(path):
+    """
+    Calcula o hash SHA-256 do arquivo em blocos
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BookStore:
+    """
+    Índice dos livros em processed_books/, invalidado por mtime/tamanho e hash
+    """
+
+    def __init__(self, books_dir=PROCESSED_BOOKS_DIR, index_path=BOOK_INDEX_PATH):
+        self.books_dir = books_dir
+        self.index_path = index_path
+        self._ingest_lock = threading.Lock()
+        self._schema_ready = False
+        # Listas de posições e offsets de tokens, carregados sob demanda pela busca
+        self.postings_cache = LRUCache(POSTINGS_CACHE_MAX_BYTES, name='postings')
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._schema_ready:
+                self._ensure_schema(conn)
+                self._schema_ready = True
+            yield conn
+        finally:
+            conn.close()
+
+    def _ensure_schema(self, conn):
+        # O índice é derivado dos arquivos: se o esquema mudou, basta recriá-lo
+        if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            conn.executescript(
+                "DROP TABLE IF EXISTS books; DROP TABLE IF EXISTS sections; "
+                "DROP TABLE IF EXISTS paragraphs; DROP TABLE IF EXISTS chapters; "
+                "DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS book_tokens;"
+            )
+            conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.executescript(SCHEMA)
+
+    @staticmethod
+    def is_valid_book_id(book_id):
+        """
+        IDs válidos são nomes de arquivo simples (sem separador de diretório nem
+        "." inicial), para que nenhum ID aponte para fora de books_dir
+        """
+        return (
+            isinstance(book_id, str) and book_id != '' and not book_id.startswith('.')
+            and os.sep not in book_id and (os.altsep is None or os.altsep not in book_id)
+            and '/' not in book_id and '\0' not in book_id
+        )
+
+    def book_path(self, book_id):
+        """
+        Caminho do arquivo do livro, ou None se o ID for inválido
+        """
+        if not self.is_valid_book_id(book_id):
+            return None
+        return os.path.join(self.books_dir, f"{book_id}.md")
+
+    def list_book_ids(self):
+        """
+        Lista os IDs dos livros disponíveis no diretório
+        """
+        if not os.path.exists(self.books_dir):
+            return []
+        return sorted(
+            filename[:-len('.md')]
+            for filename in os.listdir(self.books_dir)
+            if filename.endswith('.md')
+        )
+
+    def get_book(self, book_id):
+        """
+        Retorna os metadados indexados do livro, reindexando se o arquivo mudou
+
+        Retorna None se o livro não existir.
+        """
+        path = self.book_path(book_id)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        with self.connect() as conn:
+            row = conn.execute("SELECT * FROM books WHERE book_id = ?", (book_id,)).fetchone()
+            if row is not None and self._is_fresh(conn, row, path, stat):
+                return dict(row)
+
+        with self._ingest_lock:
+            return self._ingest(book_id, path)
+
+    def get_sections(self, book_id, start=1, limit=None):
+        """
+        Retorna os limites das seções indexadas (sem o texto)
+
+        `start` é o ID da primeira seção e `limit` o máximo de seções devolvidas.
+        """
+        if self.get_book(book_id) is None:
+            return None
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT section_id, title, byte_start, byte_end, word_count "
+                "FROM sections WHERE book_id = ? AND section_id >= ? ORDER BY section_id LIMIT ?",
+                (book_id, start, -1 if limit is None else limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_paragraphs(self, book_id):
+        """
+        Retorna (byte_start, byte_end, palavras) de cada parágrafo indexado
+        """
+        if self.get_book(book_id) is None:
+            return None
+        with self.connect() as conn:
+            return conn.execute(
+                "SELECT byte_start, byte_end, word_count FROM paragraphs "
+                "WHERE book_id = ? ORDER BY paragraph_id",
+                (book_id,)
+            ).fetchall()
+
+    def search(self, query, book_ids=None, limit=20):
+        """
+        Busca frases e NEAR em todos os livros (ou nos de book_ids) pelo índice invertido
+
+        Só as listas de posições dos termos da busca são lidas do disco. Os
+        acertos vêm em ordem de livro e de posição, com seção, offsets de
+        caractere dentro da seção e trecho. Retorna None se a busca não tiver
+        palavras.
+        """
+        phrases, distances = parse_query(query)
+        if not phrases:
+            return None
+
+        books = {}
+        for book_id in (book_ids if book_ids is not None else self.list_book_ids()):
+            book = self.get_book(book_id)
+            if book is not None:
+                books[book_id] = book
+        signature = tuple((book_id, books[book_id]["sha256"]) for book_id in sorted(books))
+
+        terms = [term for phrase in phrases for term in phrase]
+        postings_by_term = {
+            term: self.postings_cache.get_or_load(
+                ('postings', term, signature),
+                lambda term=term: self._load_postings(term, books)
+            )
+            for term in dict.fromkeys(terms)
+        }
+
+        results = []
+        matches_per_book = {}
+        for book_id in sorted(books):
+            book_postings = {
+                term: postings[book_id]
+                for term, postings in postings_by_term.items()
+                if book_id in postings
+            }
+            spans = match_query(phrases, distances, book_postings)
+            if not spans:
+                continue
+            matches_per_book[book_id] = len(spans)
+
+            remaining = limit - len(results)
+            if remaining > 0:
+                hits = self._locate(book_id, books[book_id], spans[:remaining])
+                results.extend(dict(hit, book_id=book_id) for hit in hits)
+
+        return {
+            "terms": terms,
+            "phrases": phrases,
+            "near_distances": distances,
+            "results": results,
+            "total_matches": sum(matches_per_book.values()),
+            "matches_per_book": matches_per_book
+        }
+
+    def _load_postings(self, term, books):
+        with self.connect() as conn:
+            rows = conn.execute("SELECT book_id, positions FROM postings WHERE term = ?", (term,)).fetchall()
+        return {
+            row["book_id"]: decode_positions(row["positions"])
+            for row in rows
+            if row["book_id"] in books
+        }
+
+    def _load_byte_offsets(self, book_id):
+        with self.connect() as conn:
+            row = conn.execute("SELECT byte_offsets FROM book_tokens WHERE book_id = ?", (book_id,)).fetchone()
+        return decode_positions(row["byte_offsets"])
+
+    def _locate(self, book_id, book, spans):
+        byte_offsets = self.postings_cache.get_or_load(
+            ('tokens', book_id, book["sha256"]),
+            lambda: self._load_byte_offsets(book_id)
+        )
+        with self.open(book_id) as mapped:
+            return locate_hits(mapped, self.get_sections(book_id), byte_offsets, spans)
+
+    def get_chapters(self, book_id):
+        """
+        Retorna os capítulos indexados (vazio se o livro não tiver cabeçalhos)
+        """
+        if self.get_book(book_id) is None:
+            return None
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT chapter_id, title, byte_start, byte_end FROM chapters "
+                "WHERE book_id = ? ORDER BY chapter_id",
+                (book_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_section_ranges(self, book_id, words_per_section):
+        """
+        Calcula seções de qualquer tamanho a partir dos índices de parágrafos e capítulos
+
+        Retorna (byte_start, byte_end, palavras, título) sem ler o arquivo.
+        """
+        paragraphs = self.get_paragraphs(book_id)
+        if paragraphs is None:
+            return None
+        chapters = [(chapter["byte_start"], chapter["title"]) for chapter in self.get_chapters(book_id)]
+        sections = list(iter_sections(paragraphs, words_per_section, [start for start, _ in chapters]))
+        titles = label_sections(sections, chapters)
+        return [section + (title,) for section, title in zip(sections, titles)]
+
+    def open(self, book_id):
+        """
+        Abre o arquivo do livro mapeado em memória
+        """
+        path = self.book_path(book_id)
+        if path is None:
+            raise FileNotFoundError(f"Livro inválido: {book_id!r}")
+        return MappedBook(path)
+
+    def read_range(self, book_id, byte_start, byte_end):
+        """
+        Lê apenas a faixa de bytes pedida do arquivo do livro
+        """
+        with self.open(book_id) as book:
+            return book.read(byte_start, byte_end)
+
+    def read_sections(self, book_id, sections):
+        """
+        Lê o texto de várias seções mapeando o arquivo uma única vez
+        """
+        with self.open(book_id) as book:
+            return [book.read(section["byte_start"], section["byte_end"]) for section in sections]
+
+    def _is_fresh(self, conn, row, path, stat):
+        if row['index_version'] != INDEX_VERSION:
+            return False
+        if row['size'] == stat.st_size and row['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        if row['size'] != stat.st_size:
+            return False
+
+        # mtime mudou mas o tamanho não: confirma pelo hash antes de reindexar
+        if file_sha256(path) != row['sha256']:
+            return False
+        conn.execute(
+            "UPDATE books SET mtime_ns = ? WHERE book_id = ?",
+            (stat.st_mtime_ns, row['book_id'])
+        )
+        conn.commit()
+        return True
+
+    def load_chapter_index(self, book_id, sha256):
+        """
+        Lê o índice de capítulos gravado pela ingestão, se corresponder a esta versão do arquivo
+
+        Os cabeçalhos são detectados antes da normalização, então são mais
+        confiáveis que a detecção sobre o texto já achatado.
+        """
+        index_path = os.path.join(self.books_dir, f"{book_id}{CHAPTER_INDEX_SUFFIX}")
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                chapter_index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if chapter_index.get("sha256") != sha256:
+            return None
+        return [(chapter["byte_start"], chapter["title"]) for chapter in chapter_index.get("chapters", [])]
+
+    def _ingest(self, book_id, path):
+        """
+        Percorre o arquivo mapeado e grava parágrafos, capítulos, seções e contagens no índice
+
+        As contagens de palavras por parágrafo ficam guardadas, então seções de
+        qualquer tamanho são derivadas depois sem reler o arquivo.
+        """
+        stat = os.stat(path)
+        with MappedBook(path) as mapped:
+            sha256 = mapped.sha256()
+            chapters = self.load_chapter_index(book_id, sha256)
+            if chapters is None:
+                chapters = detect_chapters(mapped.buffer)
+            chapter_starts = [start for start, _ in chapters]
+            paragraphs = list(iter_paragraphs(mapped.iter_text(), chapter_starts))
+
+            # Índice invertido posicional montado a partir da cópia dobrada de
+            # cada parágrafo (alinhada caractere a caractere, só em memória)
+            def paragraph_texts():
+                for start, end, _ in paragraphs:
+                    display = mapped.read(start, end)
+                    yield start, display, fold_text(display)
+
+            postings, byte_offsets = build_positional_index(iter_tokens(paragraph_texts()))
+            file_size = mapped.size
+
+        boundaries = list(iter_sections(paragraphs, WORDS_PER_SECTION, chapter_starts))
+        titles = label_sections(boundaries, chapters)
+        word_count = sum(words for _, _, words in paragraphs)
+        chapter_ends = chapter_starts[1:] + [file_size]
+
+        book = {
+            "book_id": book_id,
+            "filename": os.path.basename(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "index_version": INDEX_VERSION,
+            "word_count": word_count,
+            "reading_time_minutes": estimate_reading_time(word_count),
+            "section_count": len(boundaries),
+            "indexed_at": datetime.now().isoformat()
+        }
+
+        with self.connect() as conn:
+            with conn:
+                conn.execute("DELETE FROM sections WHERE book_id = ?", (book_id,))
+                conn.execute("DELETE FROM paragraphs WHERE book_id = ?", (book_id,))
+                conn.execute("DELETE FROM chapters WHERE book_id = ?", (book_id,))
+                conn.execute("DELETE FROM postings WHERE book_id = ?", (book_id,))
+                conn.execute("DELETE FROM book_tokens WHERE book_id = ?", (book_id,))
+                conn.executemany(
+                    "INSERT INTO postings (term, book_id, positions) VALUES (?, ?, ?)",
+                    (
+                        (term, book_id, encode_positions(positions))
+                        for term, positions in postings.items()
+                    )
+                )
+                conn.execute(
+                    "INSERT INTO book_tokens (book_id, token_count, byte_offsets) VALUES (?, ?, ?)",
+                    (book_id, len(byte_offsets), encode_positions(byte_offsets))
+                )
+                conn.executemany(
+                    "INSERT INTO chapters (book_id, chapter_id, title, byte_start, byte_end) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (book_id, chapter_id, title, start, end)
+                        for chapter_id, ((start, title), end) in enumerate(zip(chapters, chapter_ends), 1)
+                    ]
+                )
+                conn.executemany(
+                    "INSERT INTO paragraphs (book_id, paragraph_id, byte_start, byte_end, word_count) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (book_id, paragraph_id, start, end, words)
+                        for paragraph_id, (start, end, words) in enumerate(paragraphs, 1)
+                    ]
+                )
+                conn.executemany(
+                    "INSERT INTO sections (book_id, section_id, title, byte_start, byte_end, word_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (book_id, section_id, title, start, end, words)
+                        for section_id, ((start, end, words), title) in enumerate(zip(boundaries, titles), 1)
+                    ]
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO books (book_id, filename, size, mtime_ns, sha256, index_version, "
+                    "word_count, reading_time_minutes, section_count, indexed_at) "
+                    "VALUES (:book_id, :filename, :size, :mtime_ns, :sha256, :index_version, "
+                    ":word_count, :reading_time_minutes, :section_count, :indexed_at)",
+                    book
+                )
+
+        return book
+
+
+# Instâncias compartilhadas pelas rotas
+book_store = BookStore()
+
+# As chaves incluem o hash do arquivo, então versões antigas apenas envelhecem no LRU
+book_cache = LRUCache(BOOK_CACHE_MAX_BYTES, BOOK_CACHE_TTL_SECONDS, name='books')
@@ -10,7 +10,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 load_dotenv()
 
 from flask import Flask, send_from_directory, jsonify
-from src.models.user import db
+from src.models.database import db, configure_database, init_database
+from src.models.migrations import run_migrations
+from src.json_provider import StoryLeafJSONProvider
 from src.routes.user import user_bp
 from src.routes.story import story_bp
 from src.routes.ai import ai_bp
@@ -23,13 +25,15 @@ from src.routes.book_integration import book_integration_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 
+# JSON das respostas: orjson quando instalado, datas em ISO 8601
+app.json = StoryLeafJSONProvider(app)
+
 # Enable CORS for all routes
 CORS(app, origins="*")
 
 # Configuration
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'storyleaf-secret-key-2025')
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app)  # DATABASE_URL, pool e pragmas do SQLite (ver models/database.py)
 
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api')
@@ -43,9 +47,10 @@ app.register_blueprint(mystic_audiobook_bp, url_prefix='/api')
 app.register_blueprint(book_integration_bp, url_prefix='/api')
 
 # Initialize database
-db.init_app(app)
+init_database(app, db)
 with app.app_context():
     db.create_all()
+    run_migrations(db.engine)
 
 # Health check endpoint
 @app.route('/api/health')
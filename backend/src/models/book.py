@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from typing import List, Optional
+from src.json_provider import raw_json
 import json
 
 @dataclass
@@ -33,8 +34,8 @@ class Book:
             'progress': self.progress,
             'cover_url': self.cover_url,
             'content': self.content,
-            'interactive_elements': json.loads(self.interactive_elements) if self.interactive_elements else None,
-            'ar_markers': json.loads(self.ar_markers) if self.ar_markers else None
+            'interactive_elements': raw_json(self.interactive_elements) if self.interactive_elements else None,
+            'ar_markers': raw_json(self.ar_markers) if self.ar_markers else None
         }
     
     @classmethod
@@ -110,7 +111,7 @@ class ReadingSession:
             'end_time': self.end_time,
             'pages_read': self.pages_read,
             'orvalho_earned': self.orvalho_earned,
-            'interactions': json.loads(self.interactions) if self.interactions else None
+            'interactions': raw_json(self.interactions) if self.interactions else None
         }
     
     @classmethod
@@ -0,0 +1,121 @@
+"""
+Banco da aplicação - StoryLeaf 2.0
+Instância única do Flask-SQLAlchemy usada por todos os modelos, URL vinda
+de DATABASE_URL (SQLite em src/database/app.db por padrão), opções do pool
+e pragmas aplicados a cada conexão SQLite: WAL, para que leitores não
+esperem escritores, e fsync só nos checkpoints
+"""
+
+import os
+import sqlite3
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import configure_mappers
+
+# Todos os modelos (usuários, histórias, versões...) compartilham estes metadados
+db = SQLAlchemy()
+
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'app.db')
+DATABASE_URL = os.getenv('DATABASE_URL', f"sqlite:///{DEFAULT_DATABASE_PATH}")
+
+# Pragmas do SQLite (cache_size negativo = KiB; mmap_size em bytes)
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# ON faz o SQLite aplicar os ON DELETE CASCADE. Desligado por padrão: bancos
+# criados antes da correção do FK de stories ainda apontam para "users"
+SQLITE_FOREIGN_KEYS = os.getenv('SQLITE_FOREIGN_KEYS', 'OFF')
+
+# Pool de conexões (QueuePool; no SQLite em memória o SQLAlchemy usa o seu próprio)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(database_url=DATABASE_URL):
+    """Opções de create_engine para a URL (SQLALCHEMY_ENGINE_OPTIONS)"""
+    url = make_url(database_url)
+    if is_memory_sqlite(url):
+        return {}
+
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT
+    }
+    if url.get_backend_name() == 'sqlite':
+        # Conexões do pool passam entre threads do servidor; a espera por lock fica no busy_timeout
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000
+        }
+    else:
+        # Servidores fecham conexões ociosas; testa antes de usar e recicla as antigas
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = DB_POOL_RECYCLE
+    return options
+
+
+def sqlite_pragmas():
+    """Pragmas aplicados a cada nova conexão SQLite, em ordem"""
+    return [
+        f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA foreign_keys = {SQLITE_FOREIGN_KEYS}",
+        "PRAGMA temp_store = MEMORY"
+    ]
+
+
+def install_sqlite_pragmas(engine, pragmas=None):
+    """
+    Aplica os pragmas em toda conexão que o engine abrir
+
+    Não faz nada se o engine não for SQLite. journal_mode = WAL fica gravado
+    no arquivo; os demais valem só para a conexão, por isso o evento.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    statements = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def configure_database(app, database_url=DATABASE_URL):
+    """Preenche a configuração do Flask-SQLAlchemy (antes de db.init_app)"""
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+
+def init_database(app, db):
+    """db.init_app e pragmas do SQLite no engine criado
+    
+    Chamado depois de importar os modelos: configura os mappers já aqui para
+    que os backrefs (Story.characters, Story.versions...) existam antes da
+    primeira consulta, como exigem as opções de carregamento.
+    """
+    db.init_app(app)
+    configure_mappers()
+    with app.app_context():
+        install_sqlite_pragmas(db.engine)
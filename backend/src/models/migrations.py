@@ -0,0 +1,130 @@
+"""
+Migrações leves do banco - StoryLeaf 2.0
+db.create_all() só cria tabelas novas; aqui ficam as colunas adicionadas
+depois, aplicadas na inicialização e seguras para rodar várias vezes
+"""
+
+import json
+from sqlalchemy import inspect, text
+
+
+def add_missing_columns(engine, table_name, columns):
+    """
+    Adiciona as colunas {nome: definição SQL} que ainda não existem na tabela
+
+    Retorna os nomes das colunas adicionadas. Tabelas inexistentes são
+    ignoradas (db.create_all() as cria já completas).
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return []
+
+    existing = {column['name'] for column in inspector.get_columns(table_name)}
+    added = []
+    with engine.begin() as conn:
+        for name, definition in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {definition}"))
+                added.append(name)
+    return added
+
+
+def migrate_story_history(engine):
+    """Contador de versões em stories e colunas de compressão em story_versions"""
+    added = add_missing_columns(engine, 'stories', {
+        'version_count': "INTEGER NOT NULL DEFAULT 0"
+    })
+    add_missing_columns(engine, 'story_versions', {
+        'storage': "VARCHAR(10)",
+        'payload': "BLOB",
+        'content_size': "INTEGER"
+    })
+
+    if 'version_count' in added and inspect(engine).has_table('story_versions'):
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE stories SET version_count = COALESCE("
+                "(SELECT MAX(version_number) FROM story_versions WHERE story_versions.story_id = stories.id), 0)"
+            ))
+
+
+def migrate_story_autosave(engine):
+    """Revisão do texto em stories e marca de autosave em story_versions"""
+    add_missing_columns(engine, 'stories', {
+        'revision': "INTEGER NOT NULL DEFAULT 0"
+    })
+    add_missing_columns(engine, 'story_versions', {
+        'autosave': "BOOLEAN NOT NULL DEFAULT 0"
+    })
+
+
+def migrate_story_tree(engine):
+    """
+    Move os galhos e folhas guardados como texto JSON em stories para
+    story_branches e story_leaves
+
+    As colunas antigas ficam vazias (NULL) depois da cópia, o que torna a
+    migração segura para rodar de novo. Textos que não são uma lista JSON
+    válida são mantidos como estão.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table('stories'):
+        return
+    legacy = [
+        (column, table) for column, table in (('branches', 'story_branches'), ('leaves', 'story_leaves'))
+        if column in {info['name'] for info in inspector.get_columns('stories')} and inspector.has_table(table)
+    ]
+
+    with engine.begin() as conn:
+        for column, table in legacy:
+            rows = conn.execute(text(f"SELECT id, {column} FROM stories WHERE {column} IS NOT NULL")).fetchall()
+            for story_id, raw in rows:
+                try:
+                    items = json.loads(raw) if raw else []
+                except ValueError:
+                    continue
+                if not isinstance(items, list):
+                    continue
+                conn.execute(text(f"DELETE FROM {table} WHERE story_id = :story_id"), {"story_id": story_id})
+                if items:
+                    conn.execute(
+                        text(f"INSERT INTO {table} (story_id, position, data) VALUES (:story_id, :position, :data)"),
+                        [{"story_id": story_id, "position": position, "data": json.dumps(item)}
+                         for position, item in enumerate(items)]
+                    )
+                conn.execute(text(f"UPDATE stories SET {column} = NULL WHERE id = :story_id"), {"story_id": story_id})
+
+
+def ensure_indexes(engine):
+    """
+    Cria nos bancos existentes os índices declarados nos modelos
+
+    db.create_all() só cria índices junto com tabelas novas; aqui cada índice
+    de uma tabela que já existe é criado se ainda não existir. Índices sobre
+    colunas que a tabela antiga não tem são pulados.
+    """
+    from src.models.database import db
+
+    inspector = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if index.name not in existing and {column.name for column in index.columns} <= columns:
+                index.create(bind=engine)
+
+
+MIGRATIONS = [
+    migrate_story_history,
+    migrate_story_autosave,
+    migrate_story_tree,
+    ensure_indexes
+]
+
+
+def run_migrations(engine):
+    """Aplica todas as migrações em ordem"""
+    for migration in MIGRATIONS:
+        migration(engine)
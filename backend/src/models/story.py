@@ -1,9 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from src.json_provider import raw_json
+from src.models.database import db
 import json
 
-db = SQLAlchemy()
-
 class Story(db.Model):
     __tablename__ = 'stories'
     
@@ -17,25 +16,57 @@ class Story(db.Model):
     # Metáfora da árvore
     seed_idea = db.Column(db.Text, nullable=True)  # Semente/ideia original
     trunk_plot = db.Column(db.Text, nullable=True)  # Tronco/enredo principal
-    branches = db.Column(db.Text, nullable=True)  # Galhos/ramificações (JSON)
-    leaves = db.Column(db.Text, nullable=True)  # Folhas/capítulos (JSON)
+    # Galhos (ramificações) e folhas (capítulos) ficam em story_branches e story_leaves
     
     # Metadados
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_published = db.Column(db.Boolean, default=False)
     word_count = db.Column(db.Integer, default=0)
+    version_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Número da última versão
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Muda a cada alteração (ETag)
     
     # Configurações de IA
     ai_mode = db.Column(db.String(50), default='creative')  # creative, academic, corporate, social
     ai_tone = db.Column(db.String(50), default='neutral')  # serious, poetic, persuasive, summarized
     
+    # Listagem paginada por (updated_at, id), com ou sem filtro por autor ou gênero
+    __table_args__ = (
+        db.Index('ix_stories_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_stories_user_updated_at', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_stories_genre_updated_at', 'genre', 'updated_at', 'id'),
+    )
+    
+    # Todo UPDATE sai como "... WHERE id = ? AND revision = ?" e incrementa a
+    # revisão; se outra requisição gravou antes, o flush lança StaleDataError
+    __mapper_args__ = {
+        'version_id_col': revision
+    }
+    
+    # Colunas da listagem: sem content, seed_idea, trunk_plot, branches e leaves
+    SUMMARY_FIELDS = (
+        'id', 'title', 'genre', 'mood', 'target_audience', 'user_id',
+        'created_at', 'updated_at', 'is_published', 'word_count', 'revision', 'ai_mode', 'ai_tone'
+    )
+    
     def __repr__(self):
         return f'<Story {self.title}>'
     
-    def to_dict(self):
-        return {
+    @classmethod
+    def summary_columns(cls):
+        """Colunas selecionadas no SQL para a projeção de resumo"""
+        return [getattr(cls, field) for field in cls.SUMMARY_FIELDS]
+    
+    @classmethod
+    def summary_to_dict(cls, row):
+        """Converte uma linha da projeção de resumo (sem carregar o objeto)"""
+        # As datas seguem como datetime; o provider JSON do app as escreve em ISO 8601
+        return dict(zip(cls.SUMMARY_FIELDS, row))
+    
+    def to_dict(self, include_tree=True):
+        """Dados da história; include_tree=False omite galhos e folhas (duas consultas a menos)"""
+        story = {
             'id': self.id,
             'title': self.title,
             'content': self.content,
@@ -44,32 +75,43 @@ class Story(db.Model):
             'target_audience': self.target_audience,
             'seed_idea': self.seed_idea,
             'trunk_plot': self.trunk_plot,
-            'branches': json.loads(self.branches) if self.branches else [],
-            'leaves': json.loads(self.leaves) if self.leaves else [],
             'user_id': self.user_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'is_published': self.is_published,
             'word_count': self.word_count,
+            'revision': self.revision,
             'ai_mode': self.ai_mode,
             'ai_tone': self.ai_tone
         }
+        if include_tree:
+            story['branches'] = self.tree_json(StoryBranch)
+            story['leaves'] = self.tree_json(StoryLeaf)
+        return story
+    
+    def tree_json(self, model):
+        """Galhos ou folhas como JSON cru do banco, sem montar objetos nem decodificar"""
+        rows = db.session.query(db.cast(model.data, db.Text)).filter(
+            model.story_id == self.id
+        ).order_by(model.position).all()
+        # No SQLite, números soltos voltam como int/float por causa da afinidade da coluna
+        return [raw_json(data if isinstance(data, str) else json.dumps(data)) for data, in rows]
     
     def set_branches(self, branches_list):
         """Define os galhos da história (ramificações narrativas)"""
-        self.branches = json.dumps(branches_list)
+        self.branch_items = [StoryBranch(position=position, data=item) for position, item in enumerate(branches_list or [])]
     
     def get_branches(self):
         """Obtém os galhos da história"""
-        return json.loads(self.branches) if self.branches else []
+        return [branch.data for branch in self.branch_items]
     
     def set_leaves(self, leaves_list):
         """Define as folhas da história (capítulos)"""
-        self.leaves = json.dumps(leaves_list)
+        self.leaf_items = [StoryLeaf(position=position, data=item) for position, item in enumerate(leaves_list or [])]
     
     def get_leaves(self):
         """Obtém as folhas da história"""
-        return json.loads(self.leaves) if self.leaves else []
+        return [leaf.data for leaf in self.leaf_items]
     
     def update_word_count(self):
         """Atualiza a contagem de palavras baseada no conteúdo"""
@@ -79,21 +121,79 @@ class Story(db.Model):
             self.word_count = 0
 
 
+class StoryBranch(db.Model):
+    """Um galho da história; data guarda o objeto enviado pelo editor"""
+    __tablename__ = 'story_branches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    story_id = db.Column(db.Integer, db.ForeignKey('stories.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # Ordem na lista
+    data = db.Column(db.JSON, nullable=True)
+    
+    story = db.relationship('Story', backref=db.backref(
+        'branch_items', order_by='StoryBranch.position', cascade='all, delete-orphan', passive_deletes=True, lazy=True
+    ))
+    
+    __table_args__ = (
+        db.Index('ix_story_branches_story_position', 'story_id', 'position'),
+    )
+    
+    def __repr__(self):
+        return f'<StoryBranch {self.story_id}#{self.position}>'
+    
+    def to_dict(self):
+        return {
+            'position': self.position,
+            'data': self.data
+        }
+
+
+class StoryLeaf(db.Model):
+    """Uma folha (capítulo) da história; lida e gravada sem tocar nas demais"""
+    __tablename__ = 'story_leaves'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    story_id = db.Column(db.Integer, db.ForeignKey('stories.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # Ordem na lista
+    data = db.Column(db.JSON, nullable=True)
+    
+    story = db.relationship('Story', backref=db.backref(
+        'leaf_items', order_by='StoryLeaf.position', cascade='all, delete-orphan', passive_deletes=True, lazy=True
+    ))
+    
+    __table_args__ = (
+        db.Index('ix_story_leaves_story_position', 'story_id', 'position'),
+    )
+    
+    def __repr__(self):
+        return f'<StoryLeaf {self.story_id}#{self.position}>'
+    
+    def to_dict(self):
+        return {
+            'position': self.position,
+            'data': self.data
+        }
+
+
 class Character(db.Model):
     __tablename__ = 'characters'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    personality = db.Column(db.Text, nullable=True)  # JSON com traços de personalidade
+    personality = db.Column(db.JSON, nullable=True)  # Traços de personalidade (mesmo texto JSON de antes no SQLite)
     role = db.Column(db.String(50), nullable=True)  # protagonist, antagonist, supporting
     
     # Relacionamento com história
-    story_id = db.Column(db.Integer, db.ForeignKey('stories.id'), nullable=False)
-    story = db.relationship('Story', backref=db.backref('characters', lazy=True))
+    story_id = db.Column(db.Integer, db.ForeignKey('stories.id', ondelete='CASCADE'), nullable=False)
+    story = db.relationship('Story', backref=db.backref('characters', passive_deletes=True, lazy=True))
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_characters_story_id', 'story_id'),
+    )
+    
     def __repr__(self):
         return f'<Character {self.name}>'
     
@@ -102,7 +202,7 @@ class Character(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'personality': json.loads(self.personality) if self.personality else {},
+            'personality': self.personality or {},
             'role': self.role,
             'story_id': self.story_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -110,35 +210,66 @@ class Character(db.Model):
     
     def set_personality(self, personality_dict):
         """Define a personalidade do personagem"""
-        self.personality = json.dumps(personality_dict)
+        self.personality = personality_dict
     
     def get_personality(self):
         """Obtém a personalidade do personagem"""
-        return json.loads(self.personality) if self.personality else {}
+        return self.personality or {}
 
 
 class StoryVersion(db.Model):
     __tablename__ = 'story_versions'
     
     id = db.Column(db.Integer, primary_key=True)
-    story_id = db.Column(db.Integer, db.ForeignKey('stories.id'), nullable=False)
+    story_id = db.Column(db.Integer, db.ForeignKey('stories.id', ondelete='CASCADE'), nullable=False)
     version_number = db.Column(db.Integer, nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(db.Text, nullable=False)  # Texto completo só nas versões antigas (storage NULL)
     changes_summary = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    story = db.relationship('Story', backref=db.backref('versions', lazy=True))
+    # Compressão do histórico (ver models/story_history.py)
+    storage = db.Column(db.String(10), nullable=True)  # snapshot, delta ou NULL (texto em content)
+    payload = db.Column(db.LargeBinary, nullable=True)  # zlib do texto (snapshot) ou das operações (delta)
+    content_size = db.Column(db.Integer, nullable=True)  # Tamanho do texto da versão em caracteres
+    autosave = db.Column(db.Boolean, nullable=False, default=False, server_default='0')  # Criada pelo salvamento automático
+    
+    story = db.relationship('Story', backref=db.backref('versions', passive_deletes=True, lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_story_versions_story_number', 'story_id', 'version_number'),
+    )
     
     def __repr__(self):
         return f'<StoryVersion {self.story_id}v{self.version_number}>'
     
-    def to_dict(self):
+    def to_dict(self, content=None):
+        """Dados da versão; o texto reconstruído é passado por quem o tiver"""
         return {
             'id': self.id,
             'story_id': self.story_id,
             'version_number': self.version_number,
-            'content': self.content,
+            'content': content if content is not None else self.content,
             'changes_summary': self.changes_summary,
+            'autosave': bool(self.autosave),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+    
+    # Colunas da listagem de versões (sem content e payload)
+    METADATA_FIELDS = ('id', 'story_id', 'version_number', 'changes_summary', 'created_at', 'storage', 'content_size', 'autosave')
+    
+    @classmethod
+    def metadata_columns(cls):
+        return [getattr(cls, field) for field in cls.METADATA_FIELDS]
+    
+    def metadata_dict(self):
+        """Metadados de uma versão já carregada (ver metadata_to_dict)"""
+        return self.metadata_to_dict(tuple(getattr(self, field) for field in self.METADATA_FIELDS))
+    
+    @classmethod
+    def metadata_to_dict(cls, row):
+        """Converte uma linha da projeção de metadados (sem o texto)"""
+        metadata = dict(zip(cls.METADATA_FIELDS, row))
+        metadata['storage'] = metadata['storage'] or 'full'
+        metadata['autosave'] = bool(metadata['autosave'])
+        return metadata
 
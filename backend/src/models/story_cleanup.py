@@ -0,0 +1,46 @@
+"""
+Remoção em lote de histórias - StoryLeaf 2.0
+Apaga histórias e tudo o que depende delas (personagens, versões, galhos e
+folhas) com um número fixo de comandos DELETE por lote, sem carregar
+nenhuma linha na sessão
+"""
+
+from src.models.story import Story, Character, StoryVersion, StoryBranch, StoryLeaf
+
+# Tabelas filhas, apagadas antes da história
+DEPENDENT_MODELS = (Character, StoryVersion, StoryBranch, StoryLeaf)
+
+# Ids por comando IN (abaixo do limite de variáveis do SQLite antigo, 999)
+DELETE_BATCH_SIZE = 500
+
+
+def delete_story_rows(session, story_filter):
+    """
+    Apaga as histórias que satisfazem `story_filter` e suas dependências
+
+    `story_filter` é uma condição sobre Story (Story.user_id == 3,
+    Story.id.in_(ids)...). Sempre são cinco comandos, seja qual for o número
+    de linhas: cada tabela filha é limpa com um DELETE ... WHERE story_id IN
+    (SELECT id FROM stories WHERE ...), e as histórias por último. Funciona
+    com ou sem foreign_keys ligado no SQLite. Retorna quantas histórias
+    foram apagadas; o commit fica com quem chamou.
+    """
+    story_ids = session.query(Story.id).filter(story_filter).scalar_subquery()
+    for model in DEPENDENT_MODELS:
+        session.query(model).filter(model.story_id.in_(story_ids)).delete(synchronize_session=False)
+    return session.query(Story).filter(story_filter).delete(synchronize_session=False)
+
+
+def delete_stories(session, story_ids):
+    """Apaga as histórias da lista em lotes de DELETE_BATCH_SIZE ids"""
+    story_ids = sorted(set(story_ids))
+    deleted = 0
+    for start in range(0, len(story_ids), DELETE_BATCH_SIZE):
+        batch = story_ids[start:start + DELETE_BATCH_SIZE]
+        deleted += delete_story_rows(session, Story.id.in_(batch))
+    return deleted
+
+
+def delete_user_stories(session, user_id):
+    """Apaga todas as histórias de um usuário"""
+    return delete_story_rows(session, Story.user_id == user_id)
@@ -0,0 +1,220 @@
+"""
+Histórico de versões das histórias com compressão por deltas - StoryLeaf 2.0
+A cada SNAPSHOT_INTERVAL versões é gravada uma cópia completa comprimida
+(snapshot); as demais guardam só a diferença para a versão anterior
+"""
+
+import json
+import os
+import re
+import zlib
+from difflib import SequenceMatcher
+from src.cache import LRUCache
+from src.models.story import StoryVersion
+
+# Distância máxima entre snapshots: reconstruir uma versão aplica no máximo SNAPSHOT_INTERVAL - 1 deltas
+SNAPSHOT_INTERVAL = 10
+
+# Valores de StoryVersion.storage (NULL = versão antiga, texto completo em content)
+STORAGE_SNAPSHOT = 'snapshot'
+STORAGE_DELTA = 'delta'
+
+# Palavras com o espaço que as segue: o diff por palavras é muito mais rápido que por caractere
+DIFF_TOKEN = re.compile(r'\S+\s*|\s+')
+
+# Textos de versões já reconstruídos (snapshots e versões pedidas)
+STORY_VERSION_CACHE_MAX_BYTES = int(os.getenv('STORY_VERSION_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Chave: (id, created_at) da linha da versão, que nunca muda depois de gravada.
+# created_at evita servir texto de uma versão apagada cujo id foi reutilizado.
+version_cache = LRUCache(STORY_VERSION_CACHE_MAX_BYTES, name='story_versions')
+
+
+def compress(data):
+    return zlib.compress(data.encode('utf-8'), 6)
+
+
+def decompress(payload):
+    return zlib.decompress(payload).decode('utf-8')
+
+
+def make_delta(old, new):
+    """
+    Operações que transformam old em new
+
+    Lista com inteiros positivos (copiar n caracteres de old), negativos
+    (pular n caracteres de old) e strings (inserir o texto).
+    """
+    old_tokens = DIFF_TOKEN.findall(old)
+    new_tokens = DIFF_TOKEN.findall(new)
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+
+    delta = []
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        old_length = sum(len(token) for token in old_tokens[old_start:old_end])
+        if tag == 'equal':
+            delta.append(old_length)
+            continue
+        if old_length:
+            delta.append(-old_length)
+        if new_end > new_start:
+            delta.append(''.join(new_tokens[new_start:new_end]))
+    return delta
+
+
+def apply_delta(old, delta):
+    parts = []
+    position = 0
+    for operation in delta:
+        if isinstance(operation, str):
+            parts.append(operation)
+        elif operation > 0:
+            parts.append(old[position:position + operation])
+            position += operation
+        else:
+            position -= operation
+    return ''.join(parts)
+
+
+def is_chain_start(version):
+    return version.storage is None or version.storage == STORAGE_SNAPSHOT
+
+
+def version_cache_key(version):
+    return ('story_version', version.id, version.created_at)
+
+
+def load_chain_metadata(story_id, version_number):
+    """
+    (id, número, created_at) das versões do último snapshot até version_number, em ordem
+
+    Não lê os textos. Retorna vazio se a versão não existir ou a sequência tiver lacunas.
+    """
+    chain_start = StoryVersion.query.with_entities(StoryVersion.version_number).filter(
+        StoryVersion.story_id == story_id,
+        StoryVersion.version_number <= version_number,
+        (StoryVersion.storage.is_(None)) | (StoryVersion.storage == STORAGE_SNAPSHOT)
+    ).order_by(StoryVersion.version_number.desc()).first()
+    if chain_start is None:
+        return []
+
+    chain = StoryVersion.query.with_entities(
+        StoryVersion.id, StoryVersion.version_number, StoryVersion.created_at
+    ).filter(
+        StoryVersion.story_id == story_id,
+        StoryVersion.version_number >= chain_start.version_number,
+        StoryVersion.version_number <= version_number
+    ).order_by(StoryVersion.version_number).all()
+    if len(chain) != version_number - chain_start.version_number + 1:
+        return []
+    return chain
+
+
+def apply_version(version, content):
+    """
+    Texto da versão, dado o texto da versão anterior (usado só pelos deltas)
+    """
+    if version.storage is None:
+        return version.content
+    if version.storage == STORAGE_SNAPSHOT:
+        return decompress(version.payload)
+    return apply_delta(content, json.loads(decompress(version.payload)))
+
+
+def reconstruct_version(story_id, version_number, cache=version_cache):
+    """
+    Texto completo de uma versão, ou None se ela não existir
+
+    Parte da versão mais recente da cadeia que estiver no cache (ou do
+    snapshot) e só lê do banco os deltas que faltam; o custo não passa de
+    SNAPSHOT_INTERVAL linhas, seja qual for o tamanho do histórico.
+    """
+    chain = load_chain_metadata(story_id, version_number)
+    if not chain:
+        return None
+
+    content = None
+    first_needed = 0
+    if cache is not None:
+        for index in range(len(chain) - 1, -1, -1):
+            key = version_cache_key(chain[index])
+            if key in cache:
+                content = cache.get(key)
+                first_needed = index + 1
+                break
+        if first_needed == len(chain):
+            return content
+
+    needed_ids = [version.id for version in chain[first_needed:]]
+    versions = StoryVersion.query.filter(StoryVersion.id.in_(needed_ids)).order_by(StoryVersion.version_number).all()
+    for version in versions:
+        content = apply_version(version, content)
+        # Snapshots são os checkpoints; a versão pedida costuma ser pedida de novo
+        if cache is not None and (is_chain_start(version) or version.version_number == version_number):
+            cache.set(version_cache_key(version), content)
+    return content
+
+
+def diff_texts(old, new):
+    """
+    Diferenças palavra a palavra entre dois textos
+
+    Cada mudança traz o tipo (insert, delete, replace), as faixas de
+    caracteres em cada texto e os trechos removido e inserido.
+    """
+    old_tokens = DIFF_TOKEN.findall(old)
+    new_tokens = DIFF_TOKEN.findall(new)
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+
+    changes = []
+    old_position = new_position = 0
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        old_text = ''.join(old_tokens[old_start:old_end])
+        new_text = ''.join(new_tokens[new_start:new_end])
+        if tag != 'equal':
+            changes.append({
+                'type': tag,
+                'from_start': old_position,
+                'from_end': old_position + len(old_text),
+                'to_start': new_position,
+                'to_end': new_position + len(new_text),
+                'removed': old_text,
+                'inserted': new_text
+            })
+        old_position += len(old_text)
+        new_position += len(new_text)
+    return changes
+
+
+def record_version(story, content, changes_summary, autosave=False):
+    """
+    Cria a próxima versão da história com o texto dado (o conteúdo antes da alteração)
+
+    Grava um snapshot a cada SNAPSHOT_INTERVAL versões, ou quando o delta
+    comprimido ficar maior que o snapshot; nas demais, o delta para a versão
+    anterior. O número vem do contador em Story, sem carregar as versões.
+    """
+    version_number = (story.version_count or 0) + 1
+    snapshot = compress(content)
+    storage = STORAGE_SNAPSHOT
+    payload = snapshot
+
+    if (version_number - 1) % SNAPSHOT_INTERVAL != 0:
+        previous_content = reconstruct_version(story.id, version_number - 1)
+        if previous_content is not None:
+            delta = compress(json.dumps(make_delta(previous_content, content), ensure_ascii=False, separators=(',', ':')))
+            if len(delta) < len(snapshot):
+                storage = STORAGE_DELTA
+                payload = delta
+
+    story.version_count = version_number
+    return StoryVersion(
+        story_id=story.id,
+        version_number=version_number,
+        content='',
+        storage=storage,
+        payload=payload,
+        content_size=len(content),
+        changes_summary=changes_summary,
+        autosave=autosave
+    )
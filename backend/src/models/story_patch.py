@@ -0,0 +1,90 @@
+"""
+Edições incrementais do texto das histórias - StoryLeaf 2.0
+O editor envia só as operações (inserir/apagar num offset) feitas desde a
+revisão que ele conhece; o servidor as aplica e recalcula a contagem de
+palavras apenas em volta dos trechos alterados
+"""
+
+import re
+
+# Trecho sem espaços que termina em / começa em um offset
+WORD_BEFORE = re.compile(r'\S*$')
+WORD_AFTER = re.compile(r'\S*')
+
+# Limites de um pedido de autosave
+MAX_OPERATIONS = 500
+MAX_INSERT_LENGTH = 1024 * 1024
+
+
+class PatchError(ValueError):
+    """Operação inválida (formato ou offset fora do texto)"""
+
+
+def parse_operations(operations):
+    """
+    Valida as operações recebidas e as converte em (offset, apagar, inserir)
+
+    Formatos aceitos:
+        {"op": "insert", "offset": 10, "text": "..."}
+        {"op": "delete", "offset": 10, "length": 5}
+    Offsets e tamanhos são em caracteres (code points) do texto como ele
+    está depois das operações anteriores da lista.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise PatchError('operations deve ser uma lista não vazia')
+    if len(operations) > MAX_OPERATIONS:
+        raise PatchError(f'No máximo {MAX_OPERATIONS} operações por pedido')
+
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise PatchError(f'Operação {index} inválida')
+        kind = operation.get('op')
+        offset = operation.get('offset')
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise PatchError(f'Operação {index}: offset inválido')
+
+        if kind == 'insert':
+            text = operation.get('text')
+            if not isinstance(text, str) or len(text) > MAX_INSERT_LENGTH:
+                raise PatchError(f'Operação {index}: text inválido')
+            parsed.append((offset, 0, text))
+        elif kind == 'delete':
+            length = operation.get('length')
+            if not isinstance(length, int) or isinstance(length, bool) or length < 0:
+                raise PatchError(f'Operação {index}: length inválido')
+            parsed.append((offset, length, ''))
+        else:
+            raise PatchError(f"Operação {index}: op deve ser 'insert' ou 'delete'")
+    return parsed
+
+
+def word_count_delta(content, start, end, inserted):
+    """
+    Variação da contagem de palavras ao trocar content[start:end] por inserted
+
+    Só conta as palavras da janela que vai do início da palavra que toca
+    `start` ao fim da palavra que toca `end`: fora dela as palavras não mudam,
+    porque a janela termina em espaço (ou na borda do texto) dos dois lados.
+    """
+    window_start = WORD_BEFORE.search(content, 0, start).start()
+    window_end = WORD_AFTER.match(content, end).end()
+    before = content[window_start:window_end]
+    after = content[window_start:start] + inserted + content[end:window_end]
+    return len(after.split()) - len(before.split())
+
+
+def apply_operations(content, operations, word_count):
+    """
+    Aplica as operações validadas em ordem
+
+    Retorna (novo texto, nova contagem de palavras). Lança PatchError se
+    algum offset cair fora do texto.
+    """
+    for index, (offset, length, inserted) in enumerate(operations):
+        end = offset + length
+        if end > len(content):
+            raise PatchError(f'Operação {index}: offset fora do texto ({len(content)} caracteres)')
+        word_count += word_count_delta(content, offset, end, inserted)
+        content = content[:offset] + inserted + content[end:]
+    return content, word_count
@@ -0,0 +1,127 @@
+"""
+Índice de texto completo das histórias (SQLite FTS5) - StoryLeaf 2.0
+Título, conteúdo e semente indexados numa tabela FTS5 de conteúdo externo,
+mantida em sincronia por triggers na tabela stories
+"""
+
+import re
+import threading
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+FTS_TABLE = 'stories_fts'
+
+# remove_diacritics: "coracao" encontra "coração", como a busca da biblioteca
+FTS_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content, seed_idea,
+        content='stories', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stories_fts_insert AFTER INSERT ON stories BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title, content, seed_idea)
+        VALUES (new.id, new.title, new.content, new.seed_idea);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stories_fts_delete AFTER DELETE ON stories BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, content, seed_idea)
+        VALUES ('delete', old.id, old.title, old.content, old.seed_idea);
+    END
+    """,
+    # Só reindexa quando um campo pesquisável muda (não a cada contagem de palavras)
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stories_fts_update AFTER UPDATE OF title, content, seed_idea ON stories BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, content, seed_idea)
+        VALUES ('delete', old.id, old.title, old.content, old.seed_idea);
+        INSERT INTO {FTS_TABLE} (rowid, title, content, seed_idea)
+        VALUES (new.id, new.title, new.content, new.seed_idea);
+    END
+    """
+]
+
+# Pesos do bm25 por coluna: título > semente > conteúdo
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+
+SNIPPET_TOKENS = 16
+
+_ready_engines = {}
+_ready_lock = threading.Lock()
+
+
+def ensure_story_search(session):
+    """
+    Cria o índice FTS5 e os triggers na primeira vez e o popula com as histórias existentes
+
+    Retorna False se o banco não for SQLite ou não tiver FTS5; nesse caso a
+    busca usa LIKE.
+    """
+    engine = session.get_bind()
+    with _ready_lock:
+        if engine.url in _ready_engines:
+            return _ready_engines[engine.url]
+
+        available = False
+        if engine.dialect.name == 'sqlite':
+            with engine.begin() as conn:
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": FTS_TABLE}
+                ).first() is not None
+                try:
+                    for statement in FTS_SCHEMA:
+                        conn.execute(text(statement))
+                    if not exists:
+                        # Indexa as histórias gravadas antes do índice existir
+                        conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+                    available = True
+                except OperationalError:
+                    # SQLite compilado sem FTS5
+                    available = False
+
+        _ready_engines[engine.url] = available
+        return available
+
+
+def build_match_query(query):
+    """
+    Converte o texto digitado numa consulta FTS5 segura
+
+    Cada palavra vira um termo entre aspas com prefixo ("dra"* acha "dragão"),
+    e todas precisam aparecer. Retorna None se não houver palavras.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def search_story_ids(session, query, genre=None, limit=50, offset=0):
+    """
+    Busca histórias pelo índice FTS5, ordenadas por relevância (bm25)
+
+    Retorna [(story_id, score, snippet)] com score maior = mais relevante, ou
+    None se o índice não puder ser usado para essa consulta.
+    """
+    match_query = build_match_query(query)
+    if match_query is None or not ensure_story_search(session):
+        return None
+
+    sql = (
+        f"SELECT stories.id, bm25({FTS_TABLE}, {', '.join(str(weight) for weight in BM25_WEIGHTS)}) AS score, "
+        f"snippet({FTS_TABLE}, -1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet "
+        f"FROM {FTS_TABLE} JOIN stories ON stories.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH :match"
+    )
+    params = {"match": match_query, "limit": limit, "offset": offset}
+    if genre:
+        sql += " AND stories.genre = :genre"
+        params["genre"] = genre
+    sql += " ORDER BY score LIMIT :limit OFFSET :offset"
+
+    rows = session.execute(text(sql), params).fetchall()
+    # bm25 é negativo (menor é melhor)
+    return [(row.id, -row.score, row.snippet) for row in rows]
@@ -0,0 +1,156 @@
+"""
+Memória persistente da Árvore da Vida AI - StoryLeaf 2.0
+Sessões de aprendizado, decisões, insights e evoluções gravados no banco
+(visíveis para todos os workers e mantidos entre reinícios), com limite de
+registros e de idade por tipo. Os registros que saem na compactação viram
+totais acumulados, para que contagens e médias não encolham
+"""
+
+import os
+import uuid
+from datetime import datetime, timedelta
+from src.models.database import db
+
+# Tipos de registro (as listas do antigo TREE_MEMORY)
+MEMORY_KINDS = ('learning_sessions', 'decisions_made', 'insights_generated', 'user_interactions', 'system_evolution')
+
+# Retenção por tipo: no máximo N registros e nenhum mais velho que X dias
+TREE_MEMORY_MAX_RECORDS = int(os.getenv('TREE_MEMORY_MAX_RECORDS', 1000))
+TREE_MEMORY_RETENTION_DAYS = int(os.getenv('TREE_MEMORY_RETENTION_DAYS', 90))
+
+# Compacta o tipo a cada N registros gravados por este processo
+TREE_MEMORY_COMPACT_EVERY = int(os.getenv('TREE_MEMORY_COMPACT_EVERY', 100))
+
+_appends_since_compaction = {}
+
+
+class TreeMemoryRecord(db.Model):
+    __tablename__ = 'tree_memory_records'
+
+    id = db.Column(db.Integer, primary_key=True)
+    record_id = db.Column(db.String(36), nullable=False, unique=True)  # uuid devolvido pela API
+    kind = db.Column(db.String(30), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    confidence = db.Column(db.Float, nullable=True)  # Para a média sem ler data
+    data = db.Column(db.JSON, nullable=False)  # O registro completo, como era guardado na lista
+
+    # Últimos registros de um tipo e compactação por idade
+    __table_args__ = (
+        db.Index('ix_tree_memory_kind_created_at', 'kind', 'created_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<TreeMemoryRecord {self.kind} {self.record_id}>'
+
+
+class TreeMemorySummary(db.Model):
+    """Totais dos registros já removidos pela compactação, por tipo"""
+    __tablename__ = 'tree_memory_summaries'
+
+    kind = db.Column(db.String(30), primary_key=True)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+    confidence_count = db.Column(db.Integer, nullable=False, default=0)
+    compacted_at = db.Column(db.DateTime, nullable=True)
+
+
+def append_record(kind, record):
+    """
+    Grava um registro do tipo dado e retorna seu id
+
+    Usa record["id"] se existir (senão gera um uuid) e a confiança de
+    record["confidence"] ou record["confidence_level"]. Faz commit.
+    """
+    record_id = record.get('id') or str(uuid.uuid4())
+    confidence = record.get('confidence', record.get('confidence_level'))
+    db.session.add(TreeMemoryRecord(
+        record_id=record_id,
+        kind=kind,
+        confidence=confidence if isinstance(confidence, (int, float)) else None,
+        data=record
+    ))
+    db.session.commit()
+
+    _appends_since_compaction[kind] = _appends_since_compaction.get(kind, 0) + 1
+    if _appends_since_compaction[kind] >= TREE_MEMORY_COMPACT_EVERY:
+        _appends_since_compaction[kind] = 0
+        compact(kind)
+    return record_id
+
+
+def latest_records(kind, limit=1):
+    """Os registros mais recentes do tipo (os dicts gravados), do mais novo ao mais velho"""
+    rows = TreeMemoryRecord.query.with_entities(TreeMemoryRecord.data).filter(
+        TreeMemoryRecord.kind == kind
+    ).order_by(TreeMemoryRecord.created_at.desc(), TreeMemoryRecord.id.desc()).limit(limit).all()
+    return [row.data for row in rows]
+
+
+def count_records(kind):
+    """Total de registros do tipo, incluindo os já compactados"""
+    live = db.session.query(db.func.count(TreeMemoryRecord.id)).filter(TreeMemoryRecord.kind == kind).scalar()
+    summary = db.session.get(TreeMemorySummary, kind)
+    return live + (summary.record_count if summary else 0)
+
+
+def average_confidence(kind):
+    """Confiança média do tipo (incluindo compactados), ou None se não houver nenhuma"""
+    total, count = db.session.query(
+        db.func.coalesce(db.func.sum(TreeMemoryRecord.confidence), 0.0),
+        db.func.count(TreeMemoryRecord.confidence)
+    ).filter(TreeMemoryRecord.kind == kind).one()
+    summary = db.session.get(TreeMemorySummary, kind)
+    if summary:
+        total += summary.confidence_sum
+        count += summary.confidence_count
+    return total / count if count else None
+
+
+def compact(kind, now=None):
+    """
+    Aplica a retenção ao tipo: remove os registros além dos
+    TREE_MEMORY_MAX_RECORDS mais novos e os mais velhos que
+    TREE_MEMORY_RETENTION_DAYS, somando-os em TreeMemorySummary
+
+    Retorna quantos registros foram removidos.
+    """
+    now = now or datetime.utcnow()
+    expired = TreeMemoryRecord.created_at < now - timedelta(days=TREE_MEMORY_RETENTION_DAYS)
+
+    # Registro mais novo entre os que passam do limite (se houver)
+    boundary = TreeMemoryRecord.query.with_entities(TreeMemoryRecord.created_at, TreeMemoryRecord.id).filter(
+        TreeMemoryRecord.kind == kind
+    ).order_by(
+        TreeMemoryRecord.created_at.desc(), TreeMemoryRecord.id.desc()
+    ).offset(TREE_MEMORY_MAX_RECORDS).first()
+    if boundary is not None:
+        expired = expired | (TreeMemoryRecord.created_at < boundary.created_at) | (
+            (TreeMemoryRecord.created_at == boundary.created_at) & (TreeMemoryRecord.id <= boundary.id)
+        )
+    condition = (TreeMemoryRecord.kind == kind) & expired
+
+    count, confidence_sum, confidence_count = db.session.query(
+        db.func.count(TreeMemoryRecord.id),
+        db.func.coalesce(db.func.sum(TreeMemoryRecord.confidence), 0.0),
+        db.func.count(TreeMemoryRecord.confidence)
+    ).filter(condition).one()
+    if not count:
+        return 0
+
+    summary = db.session.get(TreeMemorySummary, kind)
+    if summary is None:
+        summary = TreeMemorySummary(kind=kind, record_count=0, confidence_sum=0.0, confidence_count=0)
+        db.session.add(summary)
+    summary.record_count += count
+    summary.confidence_sum += confidence_sum
+    summary.confidence_count += confidence_count
+    summary.compacted_at = now
+
+    TreeMemoryRecord.query.filter(condition).delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def compact_all(now=None):
+    """Compacta todos os tipos; retorna {tipo: removidos}"""
+    return {kind: compact(kind, now) for kind in MEMORY_KINDS}
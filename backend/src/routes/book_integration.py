@@ -3,19 +3,22 @@ API de Integração de Livros - StoryLeaf 2.0
 Integração dos livros processados com WorldExplorer e recursos interativos
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 import json
 import os
 import uuid
-from datetime import datetime
+from bisect import bisect_left
+from datetime import datetime, timezone
+from src.library.store import PROCESSED_BOOKS_DIR, book_store, book_cache
 
 book_integration_bp = Blueprint('book_integration', __name__)
 
-# Diretório onde estão os livros processados
-PROCESSED_BOOKS_DIR = '/home/ubuntu/StoryLeaf/processed_books'
+# Limite de seções por página em /library/<book_id>/sections
+MAX_SECTIONS_PER_PAGE = 50
 
-# Cache de livros carregados
-LOADED_BOOKS = {}
+# Acertos devolvidos por /library/search
+SEARCH_RESULTS_LIMIT = 20
+MAX_SEARCH_RESULTS = 200
 
 @book_integration_bp.route("/library/list", methods=["GET"])
 def list_available_books():
@@ -49,43 +52,201 @@ def list_available_books():
     except Exception as e:
         return jsonify({"error": f"Erro ao listar livros: {str(e)}"}), 500
 
+@book_integration_bp.route("/library/cache/stats", methods=["GET"])
+def get_library_cache_stats():
+    """
+    Retorna os contadores do cache compartilhado de livros
+    """
+    return jsonify({
+        "success": True,
+        "cache": book_cache.stats(),
+        "postings_cache": book_store.postings_cache.stats()
+    }), 200
+
+@book_integration_bp.route("/library/search", methods=["GET"])
+def search_library():
+    """
+    Busca uma palavra ou frase em todos os livros processados
+
+    Sem diferenciar acentos e maiúsculas. Aceita frases ("país das
+    maravilhas") e proximidade (alice NEAR/5 coelho). Cada acerto traz o
+    livro, a seção, os offsets de caractere dentro do texto da seção e um
+    trecho. Use ?book_id= para buscar em um só livro.
+    """
+    try:
+        query = request.args.get('q', '')
+        book_id = request.args.get('book_id')
+        limit = min(max(request.args.get('limit', SEARCH_RESULTS_LIMIT, type=int), 1), MAX_SEARCH_RESULTS)
+        if book_id and book_id not in book_store.list_book_ids():
+            return jsonify({"error": "Livro não encontrado"}), 404
+        
+        search = book_store.search(query, [book_id] if book_id else None, limit)
+        if search is None:
+            return jsonify({"error": "Informe uma palavra para buscar (?q=)"}), 400
+        
+        return jsonify({
+            "success": True,
+            "query": query,
+            "terms": search["terms"],
+            "phrases": search["phrases"],
+            "near_distances": search["near_distances"],
+            "results": search["results"],
+            "total_matches": search["total_matches"],
+            "matches_per_book": search["matches_per_book"]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Erro ao buscar nos livros: {str(e)}"}), 500
+
 @book_integration_bp.route("/library/<book_id>/content", methods=["GET"])
 def get_book_content(book_id):
     """
     Retorna o conteúdo processado de um livro
+
+    O texto completo só é incluído com ?full_text=true, pois as seções já o contêm.
     """
     try:
-        book_file = os.path.join(PROCESSED_BOOKS_DIR, f"{book_id}.md")
+        book_info = book_store.get_book(book_id)
+        if book_info is None:
+            return jsonify({"error": "Livro não encontrado"}), 404
+        
+        include_full_text = is_truthy(request.args.get('full_text'))
+        etag = f"{book_info['sha256'][:16]}-content-{int(include_full_text)}"
+        if is_not_modified(etag, book_info):
+            return conditional_response(None, etag, book_info)
+        
+        book_data = load_book_data(book_id, include_full_text)
         
-        if not os.path.exists(book_file):
+        return conditional_response({
+            "success": True,
+            "book": book_data
+        }, etag, book_info)
+        
+    except Exception as e:
+        return jsonify({"error": f"Erro ao carregar livro: {str(e)}"}), 500
+
+@book_integration_bp.route("/library/<book_id>/sections", methods=["GET"])
+def get_book_sections(book_id):
+    """
+    Retorna uma página de seções do livro (?from=<id da seção>&limit=<quantidade>)
+
+    Use ?content=false para receber apenas os metadados das seções.
+    """
+    try:
+        start = request.args.get('from', 1, type=int)
+        limit = request.args.get('limit', 10, type=int)
+        include_content = is_truthy(request.args.get('content', 'true'))
+        
+        if start < 1 or limit < 1:
+            return jsonify({"error": "Parâmetros 'from' e 'limit' devem ser positivos"}), 400
+        limit = min(limit, MAX_SECTIONS_PER_PAGE)
+        
+        book_info = book_store.get_book(book_id)
+        if book_info is None:
             return jsonify({"error": "Livro não encontrado"}), 404
         
-        with open(book_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+        etag = f"{book_info['sha256'][:16]}-sections-{start}-{limit}-{int(include_content)}"
+        if is_not_modified(etag, book_info):
+            return conditional_response(None, etag, book_info)
+        
+        sections = book_store.get_sections(book_id, start=start, limit=limit)
+        texts = book_store.read_sections(book_id, sections) if include_content else None
         
-        # Divide o conteúdo em seções para melhor navegação
-        sections = split_content_into_sections(content)
+        sections_data = []
+        for i, section in enumerate(sections):
+            section_data = {
+                "id": section["section_id"],
+                "title": section["title"],
+                "word_count": section["word_count"]
+            }
+            if include_content:
+                section_data["content"] = texts[i]
+            sections_data.append(section_data)
         
-        book_data = {
-            "id": book_id,
+        next_from = start + len(sections)
+        
+        return conditional_response({
+            "success": True,
+            "book_id": book_id,
             "title": format_book_title(book_id),
-            "content": content,
-            "sections": sections,
-            "word_count": len(content.split()),
-            "reading_time_minutes": estimate_reading_time(content),
-            "processed_at": datetime.now().isoformat()
-        }
+            "sections": sections_data,
+            "from": start,
+            "limit": limit,
+            "total_sections": book_info["section_count"],
+            "next_from": next_from if next_from <= book_info["section_count"] else None
+        }, etag, book_info)
         
-        # Cache do livro
-        LOADED_BOOKS[book_id] = book_data
+    except Exception as e:
+        return jsonify({"error": f"Erro ao carregar seções: {str(e)}"}), 500
+
+@book_integration_bp.route("/library/<book_id>/sections/<int:section_id>", methods=["GET"])
+def get_book_section(book_id, section_id):
+    """
+    Retorna uma única seção do livro, lida por faixa de bytes
+    """
+    try:
+        book_info = book_store.get_book(book_id)
+        if book_info is None:
+            return jsonify({"error": "Livro não encontrado"}), 404
+        
+        if section_id < 1 or section_id > book_info["section_count"]:
+            return jsonify({"error": "Seção não encontrada"}), 404
+        
+        etag = f"{book_info['sha256'][:16]}-section-{section_id}"
+        if is_not_modified(etag, book_info):
+            return conditional_response(None, etag, book_info)
+        
+        section = book_store.get_sections(book_id, start=section_id, limit=1)[0]
+        
+        return conditional_response({
+            "success": True,
+            "book_id": book_id,
+            "section": {
+                "id": section["section_id"],
+                "title": section["title"],
+                "content": book_store.read_range(book_id, section["byte_start"], section["byte_end"]),
+                "word_count": section["word_count"]
+            },
+            "total_sections": book_info["section_count"],
+            "previous_id": section_id - 1 if section_id > 1 else None,
+            "next_id": section_id + 1 if section_id < book_info["section_count"] else None
+        }, etag, book_info)
+        
+    except Exception as e:
+        return jsonify({"error": f"Erro ao carregar seção: {str(e)}"}), 500
+
+@book_integration_bp.route("/library/<book_id>/chapters", methods=["GET"])
+def get_book_chapters(book_id):
+    """
+    Retorna o índice de capítulos do livro e a primeira seção de cada um
+    """
+    try:
+        book_info = book_store.get_book(book_id)
+        if book_info is None:
+            return jsonify({"error": "Livro não encontrado"}), 404
+        
+        sections = book_store.get_sections(book_id)
+        section_starts = [section["byte_start"] for section in sections]
+        
+        chapters = []
+        for chapter in book_store.get_chapters(book_id):
+            # As seções nunca atravessam capítulos, então uma delas começa exatamente aqui
+            first_section = sections[bisect_left(section_starts, chapter["byte_start"])]
+            chapters.append({
+                "id": chapter["chapter_id"],
+                "title": chapter["title"],
+                "first_section_id": first_section["section_id"]
+            })
         
         return jsonify({
             "success": True,
-            "book": book_data
+            "book_id": book_id,
+            "chapters": chapters,
+            "total_chapters": len(chapters)
         }), 200
         
     except Exception as e:
-        return jsonify({"error": f"Erro ao carregar livro: {str(e)}"}), 500
+        return jsonify({"error": f"Erro ao carregar capítulos: {str(e)}"}), 500
 
 @book_integration_bp.route("/library/<book_id>/world-data", methods=["GET"])
 def get_book_world_data(book_id):
@@ -93,13 +254,10 @@ def get_book_world_data(book_id):
     Retorna dados do livro formatados para o WorldExplorer
     """
     try:
-        # Carrega o livro se não estiver em cache
-        if book_id not in LOADED_BOOKS:
-            book_response = get_book_content(book_id)
-            if book_response[1] != 200:
-                return book_response
-        
-        book_data = LOADED_BOOKS[book_id]
+        # Carrega o livro do cache compartilhado (ou do índice)
+        book_data = load_book_data(book_id)
+        if book_data is None:
+            return jsonify({"error": "Livro não encontrado"}), 404
         
         # Gera dados específicos para WorldExplorer
         world_data = generate_world_data_from_book(book_data)
@@ -118,13 +276,10 @@ def get_book_audiobook_data(book_id):
     Retorna dados do livro formatados para o Mystic Audiobook
     """
     try:
-        # Carrega o livro se não estiver em cache
-        if book_id not in LOADED_BOOKS:
-            book_response = get_book_content(book_id)
-            if book_response[1] != 200:
-                return book_response
-        
-        book_data = LOADED_BOOKS[book_id]
+        # Carrega o livro do cache compartilhado (ou do índice)
+        book_data = load_book_data(book_id)
+        if book_data is None:
+            return jsonify({"error": "Livro não encontrado"}), 404
         
         # Gera dados específicos para Mystic Audiobook
         audiobook_data = generate_audiobook_data_from_book(book_data)
@@ -146,13 +301,10 @@ def analyze_book_with_ai(book_id):
         data = request.get_json()
         analysis_type = data.get('type', 'summary')
         
-        # Carrega o livro se não estiver em cache
-        if book_id not in LOADED_BOOKS:
-            book_response = get_book_content(book_id)
-            if book_response[1] != 200:
-                return book_response
-        
-        book_data = LOADED_BOOKS[book_id]
+        # Carrega o livro do cache compartilhado (ou do índice)
+        book_data = load_book_data(book_id)
+        if book_data is None:
+            return jsonify({"error": "Livro não encontrado"}), 404
         
         # Gera análise baseada no tipo solicitado
         analysis = generate_ai_analysis(book_data, analysis_type)
@@ -167,6 +319,84 @@ def analyze_book_with_ai(book_id):
     except Exception as e:
         return jsonify({"error": f"Erro na análise AI: {str(e)}"}), 500
 
+def load_book_data(book_id, include_full_text=False):
+    """
+    Monta os dados do livro a partir do índice persistente, usando o cache compartilhado
+
+    Retorna None se o livro não existir.
+    """
+    # Metadados e limites das seções vêm do índice persistente
+    book_info = book_store.get_book(book_id)
+    if book_info is None:
+        return None
+    
+    book_data = book_cache.get_or_load(
+        ('library', book_id, book_info["sha256"]),
+        lambda: build_book_data(book_id, book_info)
+    )
+    
+    if include_full_text:
+        return dict(book_data, content=book_store.read_range(book_id, 0, book_info["size"]))
+    return book_data
+
+def build_book_data(book_id, book_info):
+    """
+    Lê o arquivo uma vez e recorta as seções pelas faixas de bytes indexadas
+    """
+    sections = book_store.get_sections(book_id)
+    texts = book_store.read_sections(book_id, sections)
+    
+    return {
+        "id": book_id,
+        "title": format_book_title(book_id),
+        "sections": [
+            {
+                "id": section["section_id"],
+                "title": section["title"],
+                "content": text,
+                "word_count": section["word_count"]
+            }
+            for section, text in zip(sections, texts)
+        ],
+        "word_count": book_info["word_count"],
+        "reading_time_minutes": book_info["reading_time_minutes"],
+        "processed_at": book_info["indexed_at"]
+    }
+
+def is_truthy(value):
+    """
+    Interpreta parâmetros de query booleanos (true/1/yes)
+    """
+    return str(value).lower() in ('1', 'true', 'yes', 'sim')
+
+def book_last_modified(book_info):
+    """
+    Data de modificação do arquivo do livro, usada no cabeçalho Last-Modified
+    """
+    return datetime.fromtimestamp(book_info["mtime_ns"] / 1e9, tz=timezone.utc)
+
+def is_not_modified(etag, book_info):
+    """
+    Verifica If-None-Match / If-Modified-Since antes de ler o arquivo
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since:
+        return book_last_modified(book_info).replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def conditional_response(payload, etag, book_info):
+    """
+    Monta a resposta com ETag e Last-Modified (304 quando payload é None)
+    """
+    if payload is None:
+        response = make_response('', 304)
+    else:
+        response = make_response(jsonify(payload), 200)
+    response.set_etag(etag)
+    response.last_modified = book_last_modified(book_info)
+    return response
+
 def format_book_title(book_id):
     """
     Formata o ID do livro em um título legível
@@ -188,54 +418,6 @@ def format_book_title(book_id):
     
     return title_mapping.get(book_id, title)
 
-def split_content_into_sections(content):
-    """
-    Divide o conteúdo em seções lógicas
-    """
-    # Divide por parágrafos e agrupa em seções
-    paragraphs = content.split('\n\n')
-    sections = []
-    current_section = []
-    words_per_section = 500
-    
-    current_word_count = 0
-    section_id = 1
-    
-    for paragraph in paragraphs:
-        paragraph_words = len(paragraph.split())
-        
-        if current_word_count + paragraph_words > words_per_section and current_section:
-            sections.append({
-                "id": section_id,
-                "title": f"Seção {section_id}",
-                "content": '\n\n'.join(current_section),
-                "word_count": current_word_count
-            })
-            current_section = [paragraph]
-            current_word_count = paragraph_words
-            section_id += 1
-        else:
-            current_section.append(paragraph)
-            current_word_count += paragraph_words
-    
-    # Adiciona a última seção
-    if current_section:
-        sections.append({
-            "id": section_id,
-            "title": f"Seção {section_id}",
-            "content": '\n\n'.join(current_section),
-            "word_count": current_word_count
-        })
-    
-    return sections
-
-def estimate_reading_time(content):
-    """
-    Estima o tempo de leitura em minutos (assumindo 200 palavras por minuto)
-    """
-    word_count = len(content.split())
-    return max(1, word_count // 200)
-
 def generate_world_data_from_book(book_data):
     """
     Gera dados específicos para WorldExplorer baseados no conteúdo do livro
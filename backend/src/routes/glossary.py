@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from src.library.folding import fold_query
 
 glossary_bp = Blueprint("glossary", __name__)
 
@@ -65,11 +66,14 @@ MOCK_GLOSSARY = {
     }
 }
 
+# Termos dobrados (minúsculas, sem acentos) -> termo do glossário, montado uma vez
+GLOSSARY_INDEX = {fold_query(term): term for term in MOCK_GLOSSARY}
+
 @glossary_bp.route("/glossary/<term>", methods=["GET"])
 def get_glossary_term(term):
-    term_lower = term.lower()
-    if term_lower in MOCK_GLOSSARY:
-        return jsonify({"success": True, "term": term_lower, "data": MOCK_GLOSSARY[term_lower]})
+    glossary_term = GLOSSARY_INDEX.get(fold_query(term))
+    if glossary_term is not None:
+        return jsonify({"success": True, "term": glossary_term, "data": MOCK_GLOSSARY[glossary_term]})
     else:
         return jsonify({"success": False, "message": "Termo não encontrado no glossário."}), 404
 
@@ -11,11 +11,12 @@ from datetime import datetime
 import os
 import tempfile
 import subprocess
+from src.library.store import book_store, book_cache
 
 mystic_audiobook_bp = Blueprint('mystic_audiobook', __name__)
 
-# Diretório onde estão os livros processados
-PROCESSED_BOOKS_DIR = '/home/ubuntu/StoryLeaf/processed_books'
+# Tamanho das seções de audiobook (em palavras)
+AUDIO_WORDS_PER_SECTION = 1000
 
 # Configurações de frequências terapêuticas
 HEALING_FREQUENCIES = {
@@ -441,28 +442,26 @@ def generate_book_audiobook(book_id):
         data = request.get_json()
         
         # Verifica se o livro existe
-        book_file = os.path.join(PROCESSED_BOOKS_DIR, f"{book_id}.md")
-        if not os.path.exists(book_file):
+        book_info = book_store.get_book(book_id)
+        if book_info is None:
             return jsonify({"error": "Livro não encontrado"}), 404
         
-        # Carrega o conteúdo do livro
-        with open(book_file, 'r', encoding='utf-8') as f:
-            book_content = f.read()
-        
         # Parâmetros de configuração
         voice_type = data.get('voice_type', 'female_voice')
         healing_frequency = data.get('healing_frequency', '432')
         soundtrack_type = data.get('soundtrack_type', 'spiritual')
         section_id = data.get('section_id', None)  # Para gerar seção específica
         
-        # Divide o conteúdo em seções se necessário
-        if section_id:
-            sections = split_book_into_sections(book_content)
-            if section_id > len(sections):
-                return jsonify({"error": "Seção não encontrada"}), 404
-            content_to_generate = sections[section_id - 1]
-        else:
-            content_to_generate = book_content[:2000]  # Limita para demonstração
+        # Lê só a seção (ou o trecho inicial) necessária do arquivo mapeado em memória
+        with book_store.open(book_id) as book:
+            if section_id:
+                sections = load_audio_sections(book_id, book_info)
+                if section_id > len(sections):
+                    return jsonify({"error": "Seção não encontrada"}), 404
+                byte_start, byte_end, _, _ = sections[section_id - 1]
+                content_to_generate = book.read(byte_start, byte_end)
+            else:
+                content_to_generate = book.read_chars(0, 2000)  # Limita para demonstração
         
         # Gera o audiobook
         audiobook_id = str(uuid.uuid4())
@@ -498,24 +497,23 @@ def get_book_sections_for_audio(book_id):
     Retorna as seções do livro disponíveis para geração de audiobook
     """
     try:
-        book_file = os.path.join(PROCESSED_BOOKS_DIR, f"{book_id}.md")
-        if not os.path.exists(book_file):
+        book_info = book_store.get_book(book_id)
+        if book_info is None:
             return jsonify({"error": "Livro não encontrado"}), 404
         
-        with open(book_file, 'r', encoding='utf-8') as f:
-            book_content = f.read()
-        
-        sections = split_book_into_sections(book_content)
+        sections = load_audio_sections(book_id, book_info)
         
+        # Usa as contagens do índice e lê apenas o início de cada seção
         sections_info = []
-        for i, section in enumerate(sections, 1):
-            sections_info.append({
-                "id": i,
-                "title": f"Seção {i}",
-                "word_count": len(section.split()),
-                "estimated_duration": estimate_audio_duration(section),
-                "preview": section[:100] + "..."
-            })
+        with book_store.open(book_id) as book:
+            for i, (byte_start, byte_end, word_count, title) in enumerate(sections, 1):
+                sections_info.append({
+                    "id": i,
+                    "title": title,
+                    "word_count": word_count,
+                    "estimated_duration": estimate_audio_duration_from_words(word_count),
+                    "preview": book.read_chars(byte_start, 100, byte_end) + "..."
+                })
         
         return jsonify({
             "success": True,
@@ -536,15 +534,13 @@ def generate_book_preview(book_id):
     try:
         data = request.get_json()
         
-        book_file = os.path.join(PROCESSED_BOOKS_DIR, f"{book_id}.md")
-        if not os.path.exists(book_file):
+        book_info = book_store.get_book(book_id)
+        if book_info is None:
             return jsonify({"error": "Livro não encontrado"}), 404
         
-        with open(book_file, 'r', encoding='utf-8') as f:
-            book_content = f.read()
-        
         # Pega apenas o início do livro para prévia
-        preview_content = book_content[:500]  # Primeiras 500 caracteres
+        with book_store.open(book_id) as book:
+            preview_content = book.read_chars(0, 500)  # Primeiras 500 caracteres
         
         voice_type = data.get('voice_type', 'female_voice')
         healing_frequency = data.get('healing_frequency', '432')
@@ -565,40 +561,27 @@ def generate_book_preview(book_id):
     except Exception as e:
         return jsonify({"error": f"Erro na prévia: {str(e)}"}), 500
 
-def split_book_into_sections(content):
+def load_audio_sections(book_id, book_info):
     """
-    Divide o conteúdo do livro em seções para audiobook
+    Retorna as faixas (byte_start, byte_end, palavras, título) das seções de audiobook
+
+    Calculadas a partir dos índices de parágrafos e capítulos e guardadas no cache compartilhado.
     """
-    # Divide por parágrafos e agrupa em seções de ~1000 palavras
-    paragraphs = content.split('\n\n')
-    sections = []
-    current_section = []
-    words_per_section = 1000
-    
-    current_word_count = 0
-    
-    for paragraph in paragraphs:
-        paragraph_words = len(paragraph.split())
-        
-        if current_word_count + paragraph_words > words_per_section and current_section:
-            sections.append('\n\n'.join(current_section))
-            current_section = [paragraph]
-            current_word_count = paragraph_words
-        else:
-            current_section.append(paragraph)
-            current_word_count += paragraph_words
-    
-    # Adiciona a última seção
-    if current_section:
-        sections.append('\n\n'.join(current_section))
-    
-    return sections
+    return book_cache.get_or_load(
+        ('audio_sections', book_id, book_info["sha256"]),
+        lambda: book_store.get_section_ranges(book_id, AUDIO_WORDS_PER_SECTION)
+    )
 
 def estimate_audio_duration(text):
     """
     Estima duração do áudio baseado no texto (assumindo 150 palavras por minuto)
     """
-    word_count = len(text.split())
+    return estimate_audio_duration_from_words(len(text.split()))
+
+def estimate_audio_duration_from_words(word_count):
+    """
+    Estima duração do áudio a partir da contagem de palavras
+    """
     duration_minutes = max(1, word_count / 150)
     return round(duration_minutes, 1)
 
@@ -1,20 +1,135 @@
-from flask import Blueprint, request, jsonify
-from src.models.user import db
-from src.models.story import Story, Character, StoryVersion
-from datetime import datetime
+from flask import Blueprint, current_app, request, jsonify
+from src.models.database import db
+from src.models.story import Story, Character, StoryVersion, StoryBranch, StoryLeaf
+from src.models.story_cleanup import delete_stories, delete_story_rows, delete_user_stories
+from src.models.story_history import diff_texts, reconstruct_version, record_version
+from src.models.story_patch import PatchError, apply_operations, parse_operations
+from src.models.story_search import search_story_ids
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import datetime, timedelta
+import base64
 import json
 
 story_bp = Blueprint('story', __name__)
 
+# Resultados por página da busca
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Histórias por página da listagem
+STORIES_PAGE_SIZE = 20
+MAX_STORIES_PAGE_SIZE = 100
+
+# Autosaves dentro desta janela após a última versão de autosave não criam outra versão
+AUTOSAVE_COALESCE_SECONDS = 300
+AUTOSAVE_SUMMARY = 'Salvamento automático'
+
+# Histórias por pedido de remoção em lote (por lista de ids)
+MAX_BULK_DELETE = 10000
+
+# Partes opcionais de GET /stories/<id>/detail (?include=characters,versions_meta)
+DETAIL_INCLUDES = ('characters', 'versions_meta', 'branches', 'leaves')
+DEFAULT_DETAIL_INCLUDES = ('branches', 'leaves')
+
+# Coleções da árvore editáveis item a item: /stories/<id>/branches e /stories/<id>/leaves
+TREE_ITEM_MODELS = {
+    'branches': StoryBranch,
+    'leaves': StoryLeaf
+}
+
+def encode_cursor(updated_at, story_id):
+    """Cursor opaco com a posição (updated_at, id) da última história da página"""
+    payload = json.dumps([updated_at.isoformat() if updated_at else None, story_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Retorna (updated_at, id) do cursor, ou lança ValueError se for inválido"""
+    try:
+        updated_at, story_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(updated_at) if updated_at else None), int(story_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+def current_revision(story_id):
+    """Revisão da história sem carregar o conteúdo (None se não existir)"""
+    return db.session.query(Story.revision).filter(Story.id == story_id).scalar()
+
+def if_match_failed(revision):
+    """Verdadeiro se o pedido trouxe If-Match e nenhuma ETag bate com a revisão"""
+    if not request.headers.get('If-Match'):
+        return False
+    return not request.if_match.contains_weak(str(revision))
+
+def conflict_response(story_id, status=412):
+    """Resposta de conflito com a revisão atual, para o cliente recarregar"""
+    revision = current_revision(story_id)
+    response = jsonify({
+        'success': False,
+        'error': 'A história foi alterada por outra requisição',
+        'revision': revision
+    })
+    response.status_code = status
+    if revision is not None:
+        response.set_etag(str(revision))
+    return response
+
+def with_etag(response, story):
+    response.set_etag(str(story.revision))
+    return response
+
 @story_bp.route('/stories', methods=['GET'])
 def get_stories():
-    """Obtém todas as histórias do usuário"""
+    """Lista resumos das histórias, das mais recentes para as mais antigas
+    
+    Paginação por cursor (?cursor= com o next_cursor da página anterior) e
+    filtros ?user_id= e ?genre=. O conteúdo completo só vem em
+    GET /stories/<id>.
+    """
     try:
-        # Por enquanto, retorna todas as histórias (implementar autenticação depois)
-        stories = Story.query.all()
+        limit = min(max(request.args.get('limit', STORIES_PAGE_SIZE, type=int), 1), MAX_STORIES_PAGE_SIZE)
+        user_id = request.args.get('user_id', type=int)
+        genre = request.args.get('genre')
+        cursor = request.args.get('cursor')
+        
+        # Só as colunas do resumo saem do banco
+        stories_query = Story.query.with_entities(*Story.summary_columns())
+        
+        if user_id is not None:
+            stories_query = stories_query.filter(Story.user_id == user_id)
+        if genre:
+            stories_query = stories_query.filter(Story.genre == genre)
+        
+        # Keyset: continua depois da última (updated_at, id) vista, sem OFFSET
+        if cursor:
+            try:
+                cursor_updated_at, cursor_id = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            stories_query = stories_query.filter(
+                (Story.updated_at < cursor_updated_at) |
+                ((Story.updated_at == cursor_updated_at) & (Story.id < cursor_id))
+            )
+        
+        rows = stories_query.order_by(Story.updated_at.desc(), Story.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        stories = [Story.summary_to_dict(row) for row in rows]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(last.updated_at, last.id)
+        
         return jsonify({
             'success': True,
-            'stories': [story.to_dict() for story in stories]
+            'stories': stories,
+            'count': len(stories),
+            'has_more': has_more,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         return jsonify({
@@ -75,12 +190,74 @@ def create_story():
 
 @story_bp.route('/stories/<int:story_id>', methods=['GET'])
 def get_story(story_id):
-    """Obtém uma história específica"""
+    """Obtém uma história específica (com ETag; If-None-Match responde 304)"""
     try:
+        revision = current_revision(story_id)
+        if revision is not None and request.if_none_match.contains_weak(str(revision)):
+            response = current_app.response_class(status=304)
+            response.set_etag(str(revision))
+            return response
+        
         story = Story.query.get_or_404(story_id)
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'story': story.to_dict()
+        }), story)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>/detail', methods=['GET'])
+def get_story_detail(story_id):
+    """História com as partes pedidas em ?include= numa única requisição
+    
+    Partes: characters, versions_meta (versões sem o texto), branches e
+    leaves; sem ?include= vêm galhos e folhas, como em GET /stories/<id>.
+    São no máximo cinco consultas (a história e uma por parte), seja qual
+    for o número de personagens ou versões.
+    """
+    try:
+        include_param = request.args.get('include')
+        if include_param is None:
+            include = set(DEFAULT_DETAIL_INCLUDES)
+        else:
+            include = {part.strip() for part in include_param.split(',') if part.strip()}
+        unknown = include - set(DETAIL_INCLUDES)
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f"include inválido: {', '.join(sorted(unknown))} (opções: {', '.join(DETAIL_INCLUDES)})"
+            }), 400
+        
+        options = []
+        if 'characters' in include:
+            options.append(selectinload(Story.characters))
+        if 'versions_meta' in include:
+            options.append(selectinload(Story.versions).load_only(*StoryVersion.metadata_columns()))
+        
+        story = Story.query.options(*options).filter(Story.id == story_id).first()
+        if story is None:
+            return jsonify({
+                'success': False,
+                'error': 'História não encontrada'
+            }), 404
+        
+        detail = story.to_dict(include_tree=False)
+        if 'branches' in include:
+            detail['branches'] = story.tree_json(StoryBranch)
+        if 'leaves' in include:
+            detail['leaves'] = story.tree_json(StoryLeaf)
+        if 'characters' in include:
+            detail['characters'] = [character.to_dict() for character in story.characters]
+        if 'versions_meta' in include:
+            versions = sorted(story.versions, key=lambda version: version.version_number, reverse=True)
+            detail['versions'] = [version.metadata_dict() for version in versions]
+        
+        return jsonify({
+            'success': True,
+            'story': detail
         })
     except Exception as e:
         return jsonify({
@@ -90,19 +267,29 @@ def get_story(story_id):
 
 @story_bp.route('/stories/<int:story_id>', methods=['PUT'])
 def update_story(story_id):
-    """Atualiza uma história"""
+    """Atualiza uma história
+    
+    Com If-Match (a ETag de GET /stories/<id>), só grava se a história ainda
+    estiver naquela revisão; senão responde 412 sem criar versão. A gravação
+    em si é um UPDATE condicionado à revisão lida, então duas requisições
+    simultâneas nunca se sobrescrevem.
+    """
     try:
+        # Checagem barata antes de carregar o texto e calcular a versão
+        revision = current_revision(story_id)
+        if revision is not None and if_match_failed(revision):
+            return conflict_response(story_id)
+        
         story = Story.query.get_or_404(story_id)
+        # De novo com a revisão carregada, que é a usada no WHERE do UPDATE:
+        # alguém pode ter gravado entre as duas leituras
+        if if_match_failed(story.revision):
+            return conflict_response(story_id)
         data = request.get_json()
         
-        # Criar versão antes de atualizar
-        if story.content and data.get('content') != story.content:
-            version = StoryVersion(
-                story_id=story.id,
-                version_number=len(story.versions) + 1,
-                content=story.content,
-                changes_summary=data.get('changes_summary', 'Atualização automática')
-            )
+        # Criar versão antes de atualizar (delta para a versão anterior ou snapshot)
+        if story.content and 'content' in data and data['content'] != story.content:
+            version = record_version(story, story.content, data.get('changes_summary', 'Atualização automática'))
             db.session.add(version)
         
         # Atualizar campos
@@ -138,11 +325,14 @@ def update_story(story_id):
         
         db.session.commit()
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'story': story.to_dict()
-        })
+        }), story)
         
+    except StaleDataError:
+        db.session.rollback()
+        return conflict_response(story_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -150,20 +340,110 @@ def update_story(story_id):
             'error': str(e)
         }), 500
 
-@story_bp.route('/stories/<int:story_id>', methods=['DELETE'])
-def delete_story(story_id):
-    """Deleta uma história"""
+def should_record_autosave(story, now):
+    """Falso se a última versão for um autosave recente (os autosaves seguidos viram uma versão só)"""
+    if not story.version_count:
+        return True
+    last_version = StoryVersion.query.with_entities(StoryVersion.autosave, StoryVersion.created_at).filter_by(
+        story_id=story.id, version_number=story.version_count
+    ).first()
+    if last_version is None or not last_version.autosave or last_version.created_at is None:
+        return True
+    return now - last_version.created_at >= timedelta(seconds=AUTOSAVE_COALESCE_SECONDS)
+
+@story_bp.route('/stories/<int:story_id>/content', methods=['PATCH'])
+def patch_story_content(story_id):
+    """Salvamento automático: aplica operações de texto sobre uma revisão
+    
+    Corpo: {"base_revision": 7, "operations": [{"op": "insert", "offset": 120,
+    "text": "..."}, {"op": "delete", "offset": 40, "length": 3}]}. Se a
+    revisão não for a atual, responde 409 com a revisão atual para o editor
+    recarregar o texto. A resposta não traz o conteúdo, só a nova revisão.
+    """
     try:
+        data = request.get_json() or {}
+        
+        base_revision = data.get('base_revision')
+        if not isinstance(base_revision, int) or isinstance(base_revision, bool):
+            return jsonify({
+                'success': False,
+                'error': 'base_revision é obrigatório'
+            }), 400
+        
+        revision = current_revision(story_id)
+        if revision is None:
+            return jsonify({
+                'success': False,
+                'error': 'História não encontrada'
+            }), 404
+        if base_revision != revision:
+            return conflict_response(story_id, 409)
+        
         story = Story.query.get_or_404(story_id)
+        if base_revision != story.revision:
+            return conflict_response(story_id, 409)
         
-        # Deletar personagens associados
-        Character.query.filter_by(story_id=story_id).delete()
+        try:
+            operations = parse_operations(data.get('operations'))
+            content, word_count = apply_operations(story.content or '', operations, story.word_count or 0)
+        except PatchError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        # Deletar versões associadas
-        StoryVersion.query.filter_by(story_id=story_id).delete()
+        now = datetime.utcnow()
+        version_recorded = False
+        if content != story.content and story.content and should_record_autosave(story, now):
+            version = record_version(story, story.content, data.get('changes_summary', AUTOSAVE_SUMMARY), autosave=True)
+            db.session.add(version)
+            version_recorded = True
+        
+        if content != (story.content or ''):
+            story.content = content
+            story.word_count = word_count
+            story.updated_at = now
         
-        # Deletar história
-        db.session.delete(story)
+        db.session.commit()
+        
+        return with_etag(jsonify({
+            'success': True,
+            'revision': story.revision,
+            'word_count': story.word_count,
+            'content_length': len(story.content or ''),
+            'version_recorded': version_recorded,
+            'updated_at': story.updated_at.isoformat() if story.updated_at else None
+        }), story)
+        
+    except StaleDataError:
+        db.session.rollback()
+        return conflict_response(story_id, 409)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>', methods=['DELETE'])
+def delete_story(story_id):
+    """Deleta uma história (respeita If-Match como o PUT)"""
+    try:
+        revision = current_revision(story_id)
+        if revision is None:
+            return jsonify({
+                'success': False,
+                'error': 'História não encontrada'
+            }), 404
+        if if_match_failed(revision):
+            return conflict_response(story_id)
+        
+        # Personagens, versões, galhos e folhas saem junto, sem carregar nada;
+        # a condição na revisão barra uma gravação feita no meio do caminho
+        deleted = delete_story_rows(db.session, (Story.id == story_id) & (Story.revision == revision))
+        if not deleted:
+            db.session.rollback()
+            return conflict_response(story_id)
         db.session.commit()
         
         return jsonify({
@@ -178,6 +458,212 @@ def delete_story(story_id):
             'error': str(e)
         }), 500
 
+@story_bp.route('/stories/bulk-delete', methods=['POST'])
+def bulk_delete_stories():
+    """Deleta várias histórias numa transação
+    
+    Corpo: {"story_ids": [1, 2, 3]} ou {"user_id": 7} (todas as histórias do
+    usuário). Os comandos são em lote: o número de idas ao banco não depende
+    de quantos personagens e versões as histórias têm.
+    """
+    try:
+        data = request.get_json() or {}
+        story_ids = data.get('story_ids')
+        user_id = data.get('user_id')
+        
+        if user_id is not None:
+            if not isinstance(user_id, int) or isinstance(user_id, bool):
+                return jsonify({
+                    'success': False,
+                    'error': 'user_id inválido'
+                }), 400
+            deleted = delete_user_stories(db.session, user_id)
+        elif isinstance(story_ids, list) and story_ids:
+            if not all(isinstance(story_id, int) and not isinstance(story_id, bool) for story_id in story_ids):
+                return jsonify({
+                    'success': False,
+                    'error': 'story_ids deve conter apenas números'
+                }), 400
+            if len(story_ids) > MAX_BULK_DELETE:
+                return jsonify({
+                    'success': False,
+                    'error': f'No máximo {MAX_BULK_DELETE} histórias por pedido'
+                }), 400
+            deleted = delete_stories(db.session, story_ids)
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Informe story_ids ou user_id'
+            }), 400
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'deleted': deleted
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def touch_story(story_id):
+    """Marca a história como alterada (nova revisão) num único UPDATE condicional
+    
+    Com If-Match, só altera se a revisão ainda for a do cabeçalho. Retorna
+    False se a história não existir ou estiver em outra revisão.
+    """
+    revision = current_revision(story_id)
+    if revision is None or if_match_failed(revision):
+        return False
+    updated = Story.query.filter(Story.id == story_id, Story.revision == revision).update({
+        'revision': Story.revision + 1,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    return updated == 1
+
+def tree_item_not_found():
+    return jsonify({
+        'success': False,
+        'error': 'Item não encontrado'
+    }), 404
+
+@story_bp.route('/stories/<int:story_id>/<any(branches, leaves):collection>', methods=['GET'])
+def get_tree_items(story_id, collection):
+    """Lista os galhos ou folhas da história, sem carregar o resto dela"""
+    try:
+        if current_revision(story_id) is None:
+            return tree_item_not_found()
+        model = TREE_ITEM_MODELS[collection]
+        items = model.query.filter_by(story_id=story_id).order_by(model.position).all()
+        return jsonify({
+            'success': True,
+            collection: [item.to_dict() for item in items]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>/<any(branches, leaves):collection>/<int:position>', methods=['GET'])
+def get_tree_item(story_id, collection, position):
+    """Obtém um galho ou folha pela posição"""
+    try:
+        model = TREE_ITEM_MODELS[collection]
+        item = model.query.filter_by(story_id=story_id, position=position).first()
+        if item is None:
+            return tree_item_not_found()
+        return jsonify({
+            'success': True,
+            'item': item.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>/<any(branches, leaves):collection>/<int:position>', methods=['PUT'])
+def update_tree_item(story_id, collection, position):
+    """Substitui um galho ou folha; os demais itens não são lidos nem regravados"""
+    try:
+        data = request.get_json() or {}
+        if 'data' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'data é obrigatório'
+            }), 400
+        
+        model = TREE_ITEM_MODELS[collection]
+        item = model.query.filter_by(story_id=story_id, position=position).first()
+        if item is None:
+            return tree_item_not_found()
+        if not touch_story(story_id):
+            db.session.rollback()
+            return conflict_response(story_id)
+        
+        item.data = data['data']
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'item': item.to_dict(),
+            'revision': current_revision(story_id)
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>/<any(branches, leaves):collection>', methods=['POST'])
+def append_tree_item(story_id, collection):
+    """Acrescenta um galho ou folha no fim da lista"""
+    try:
+        data = request.get_json() or {}
+        if 'data' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'data é obrigatório'
+            }), 400
+        if not touch_story(story_id):
+            db.session.rollback()
+            if current_revision(story_id) is None:
+                return tree_item_not_found()
+            return conflict_response(story_id)
+        
+        model = TREE_ITEM_MODELS[collection]
+        last_position = db.session.query(db.func.max(model.position)).filter(model.story_id == story_id).scalar()
+        item = model(story_id=story_id, position=0 if last_position is None else last_position + 1, data=data['data'])
+        db.session.add(item)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'item': item.to_dict(),
+            'revision': current_revision(story_id)
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>/<any(branches, leaves):collection>/<int:position>', methods=['DELETE'])
+def delete_tree_item(story_id, collection, position):
+    """Remove um galho ou folha e fecha o buraco na numeração com um UPDATE só"""
+    try:
+        model = TREE_ITEM_MODELS[collection]
+        deleted = model.query.filter_by(story_id=story_id, position=position).delete(synchronize_session=False)
+        if not deleted:
+            db.session.rollback()
+            return tree_item_not_found()
+        if not touch_story(story_id):
+            db.session.rollback()
+            return conflict_response(story_id)
+        
+        model.query.filter(model.story_id == story_id, model.position > position).update(
+            {'position': model.position - 1}, synchronize_session=False
+        )
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'revision': current_revision(story_id)
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @story_bp.route('/stories/<int:story_id>/characters', methods=['GET'])
 def get_story_characters(story_id):
     """Obtém personagens de uma história"""
@@ -235,12 +721,80 @@ def create_character(story_id):
 
 @story_bp.route('/stories/<int:story_id>/versions', methods=['GET'])
 def get_story_versions(story_id):
-    """Obtém versões de uma história"""
+    """Lista as versões de uma história (só metadados, sem o texto)"""
     try:
-        versions = StoryVersion.query.filter_by(story_id=story_id).order_by(StoryVersion.version_number.desc()).all()
+        rows = StoryVersion.query.with_entities(*StoryVersion.metadata_columns()).filter_by(
+            story_id=story_id
+        ).order_by(StoryVersion.version_number.desc()).all()
         return jsonify({
             'success': True,
-            'versions': [version.to_dict() for version in versions]
+            'versions': [StoryVersion.metadata_to_dict(row) for row in rows]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>/versions/<int:version_number>', methods=['GET'])
+def get_story_version(story_id, version_number):
+    """Reconstrói o texto de uma versão"""
+    try:
+        version = StoryVersion.query.filter_by(story_id=story_id, version_number=version_number).first()
+        content = reconstruct_version(story_id, version_number) if version else None
+        if content is None:
+            return jsonify({
+                'success': False,
+                'error': 'Versão não encontrada'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'version': version.to_dict(content)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@story_bp.route('/stories/<int:story_id>/versions/diff', methods=['GET'])
+def diff_story_versions(story_id):
+    """Diferenças entre duas versões (?from=3&to=7; to=current compara com o texto atual)"""
+    try:
+        story = Story.query.get_or_404(story_id)
+        
+        contents = {}
+        for param in ('from', 'to'):
+            value = request.args.get(param, 'current' if param == 'to' else '')
+            if value == 'current':
+                contents[param] = story.content or ''
+                continue
+            if not value.isdigit():
+                return jsonify({
+                    'success': False,
+                    'error': f"Parâmetro '{param}' deve ser um número de versão ou 'current'"
+                }), 400
+            contents[param] = reconstruct_version(story_id, int(value))
+            if contents[param] is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Versão {value} não encontrada'
+                }), 404
+        
+        changes = diff_texts(contents['from'], contents['to'])
+        return jsonify({
+            'success': True,
+            'from': request.args.get('from'),
+            'to': request.args.get('to', 'current'),
+            'changes': changes,
+            'stats': {
+                'changes': len(changes),
+                'characters_removed': sum(len(change['removed']) for change in changes),
+                'characters_inserted': sum(len(change['inserted']) for change in changes),
+                'from_size': len(contents['from']),
+                'to_size': len(contents['to'])
+            }
         })
     except Exception as e:
         return jsonify({
@@ -273,11 +827,42 @@ def publish_story(story_id):
 
 @story_bp.route('/stories/search', methods=['GET'])
 def search_stories():
-    """Busca histórias por título, gênero ou conteúdo"""
+    """
+    Busca histórias por título, gênero ou conteúdo, ordenadas por relevância
+
+    Os resultados vêm sem galhos e folhas (uma consulta a menos por história);
+    a árvore completa está em /stories/<id>.
+    """
     try:
         query = request.args.get('q', '')
         genre = request.args.get('genre', '')
+        limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), MAX_SEARCH_PAGE_SIZE)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        
+        # Índice FTS5: ranqueado por bm25 e com trecho destacado
+        matches = search_story_ids(Story.query.session, query, genre, limit, offset) if query else None
+        if matches is not None:
+            stories_by_id = {
+                story.id: story
+                for story in Story.query.filter(Story.id.in_([story_id for story_id, _, _ in matches])).all()
+            }
+            results = []
+            for story_id, score, snippet in matches:
+                if story_id not in stories_by_id:
+                    continue
+                story_data = stories_by_id[story_id].to_dict(include_tree=False)
+                story_data['score'] = score
+                story_data['snippet'] = snippet
+                results.append(story_data)
+            
+            return jsonify({
+                'success': True,
+                'stories': results,
+                'count': len(results),
+                'ranked': True
+            })
         
+        # Sem FTS5 (ou sem palavras na busca): filtro por LIKE, como antes
         stories_query = Story.query
         
         if query:
@@ -290,12 +875,13 @@ def search_stories():
         if genre:
             stories_query = stories_query.filter(Story.genre == genre)
         
-        stories = stories_query.all()
+        stories = stories_query.order_by(Story.id).limit(limit).offset(offset).all()
         
         return jsonify({
             'success': True,
-            'stories': [story.to_dict() for story in stories],
-            'count': len(stories)
+            'stories': [story.to_dict(include_tree=False) for story in stories],
+            'count': len(stories),
+            'ranked': False
         })
         
     except Exception as e:
@@ -303,4 +889,3 @@ def search_stories():
             'success': False,
             'error': str(e)
         }), 500
-
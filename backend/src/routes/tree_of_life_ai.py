@@ -9,33 +9,31 @@ import time
 import uuid
 from datetime import datetime, timedelta
 import os
+from src.models.tree_memory import (
+    TREE_MEMORY_MAX_RECORDS, TREE_MEMORY_RETENTION_DAYS,
+    append_record, average_confidence, compact_all, count_records, latest_records
+)
 
 tree_of_life_ai_bp = Blueprint('tree_of_life_ai', __name__)
 
-# Memória da Árvore da Vida AI (em produção, seria persistida em banco de dados)
-TREE_MEMORY = {
-    "learning_sessions": [],
-    "decisions_made": [],
-    "insights_generated": [],
-    "user_interactions": [],
-    "system_evolution": [],
-    "knowledge_base": {
-        "storyleaf_essence": {
-            "core_metaphor": "árvore da vida",
-            "pillars": ["WRITE", "READ", "LEARN", "CONVERT"],
-            "mission": "tornar histórias vivas e interativas",
-            "values": ["acessibilidade", "gamificação", "imersão", "criatividade"]
-        },
-        "technical_understanding": {
-            "genie3_capabilities": ["world_generation", "physics_simulation", "real_time_interaction"],
-            "limitations": ["duration_limited", "action_space_restricted", "text_rendering_dependent"],
-            "integration_patterns": ["api_communication", "state_persistence", "cost_management"]
-        },
-        "user_patterns": {
-            "engagement_factors": ["visual_appeal", "interactivity", "progress_tracking"],
-            "common_workflows": ["story_creation", "world_exploration", "learning_quests"],
-            "feedback_themes": ["ease_of_use", "magical_experience", "educational_value"]
-        }
+# Conhecimento fixo da Árvore da Vida AI; sessões, decisões, insights e
+# evoluções ficam no banco (ver models/tree_memory.py)
+TREE_KNOWLEDGE_BASE = {
+    "storyleaf_essence": {
+        "core_metaphor": "árvore da vida",
+        "pillars": ["WRITE", "READ", "LEARN", "CONVERT"],
+        "mission": "tornar histórias vivas e interativas",
+        "values": ["acessibilidade", "gamificação", "imersão", "criatividade"]
+    },
+    "technical_understanding": {
+        "genie3_capabilities": ["world_generation", "physics_simulation", "real_time_interaction"],
+        "limitations": ["duration_limited", "action_space_restricted", "text_rendering_dependent"],
+        "integration_patterns": ["api_communication", "state_persistence", "cost_management"]
+    },
+    "user_patterns": {
+        "engagement_factors": ["visual_appeal", "interactivity", "progress_tracking"],
+        "common_workflows": ["story_creation", "world_exploration", "learning_quests"],
+        "feedback_themes": ["ease_of_use", "magical_experience", "educational_value"]
     }
 }
 
@@ -110,7 +108,7 @@ def process_learning_session():
             "integration_status": "processed"
         }
         
-        TREE_MEMORY["learning_sessions"].append(learning_session)
+        append_record("learning_sessions", learning_session)
         
         return jsonify({
             "success": True,
@@ -151,7 +149,7 @@ def autonomous_decision():
             "outcome_tracking": "pending"
         }
         
-        TREE_MEMORY["decisions_made"].append(decision_record)
+        append_record("decisions_made", decision_record)
         
         return jsonify({
             "success": True,
@@ -185,7 +183,7 @@ def generate_insights():
             "actionable_items": extract_actionable_items(insights)
         }
         
-        TREE_MEMORY["insights_generated"].append(insight_session)
+        append_record("insights_generated", insight_session)
         
         return jsonify({
             "success": True,
@@ -224,7 +222,7 @@ def trigger_evolution():
             "version": evolution_result["new_version"]
         }
         
-        TREE_MEMORY["system_evolution"].append(evolution_record)
+        append_record("system_evolution", evolution_record)
         
         return jsonify({
             "success": True,
@@ -245,14 +243,18 @@ def get_tree_memory():
     """
     try:
         memory_summary = {
-            "total_learning_sessions": len(TREE_MEMORY["learning_sessions"]),
-            "total_decisions": len(TREE_MEMORY["decisions_made"]),
-            "total_insights": len(TREE_MEMORY["insights_generated"]),
+            "total_learning_sessions": count_records("learning_sessions"),
+            "total_decisions": count_records("decisions_made"),
+            "total_insights": count_records("insights_generated"),
             "knowledge_base_size": calculate_knowledge_base_size(),
             "recent_activity": get_recent_activity(),
-            "core_knowledge": TREE_MEMORY["knowledge_base"],
+            "core_knowledge": TREE_KNOWLEDGE_BASE,
             "memory_health": "excellent",
-            "retention_rate": 0.98
+            "retention_rate": 0.98,
+            "retention_policy": {
+                "max_records_per_type": TREE_MEMORY_MAX_RECORDS,
+                "max_age_days": TREE_MEMORY_RETENTION_DAYS
+            }
         }
         
         return jsonify({
@@ -264,12 +266,31 @@ def get_tree_memory():
     except Exception as e:
         return jsonify({"error": f"Erro ao acessar memória: {str(e)}"}), 500
 
+@tree_of_life_ai_bp.route('/api/tree-ai/memory/compact', methods=['POST'])
+def compact_tree_memory():
+    """
+    Aplica a política de retenção à memória agora (também roda sozinha a cada
+    TREE_MEMORY_COMPACT_EVERY registros)
+    """
+    try:
+        removed = compact_all()
+        
+        return jsonify({
+            "success": True,
+            "removed": removed,
+            "message": "Memória da Árvore da Vida AI compactada."
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Erro ao compactar memória: {str(e)}"}), 500
+
 # Funções auxiliares para processamento interno
 
 def get_last_learning_session():
     """Retorna informações da última sessão de aprendizado"""
-    if TREE_MEMORY["learning_sessions"]:
-        last_session = TREE_MEMORY["learning_sessions"][-1]
+    last_sessions = latest_records("learning_sessions", 1)
+    if last_sessions:
+        last_session = last_sessions[0]
         return {
             "timestamp": last_session["timestamp"],
             "type": last_session["type"],
@@ -292,25 +313,22 @@ def determine_current_focus():
 def calculate_knowledge_growth():
     """Calcula o crescimento do conhecimento"""
     base_knowledge = 100
-    learning_sessions = len(TREE_MEMORY["learning_sessions"])
-    decisions = len(TREE_MEMORY["decisions_made"])
-    insights = len(TREE_MEMORY["insights_generated"])
+    learning_sessions = count_records("learning_sessions")
+    decisions = count_records("decisions_made")
+    insights = count_records("insights_generated")
     
     growth_rate = (learning_sessions * 2 + decisions * 1.5 + insights * 3) / 100
     return min(base_knowledge + growth_rate, 200)  # Cap em 200%
 
 def calculate_decision_confidence():
     """Calcula a confiança nas decisões"""
-    if not TREE_MEMORY["decisions_made"]:
-        return 0.5
-    
-    total_confidence = sum(d.get("confidence", 0.5) for d in TREE_MEMORY["decisions_made"])
-    return total_confidence / len(TREE_MEMORY["decisions_made"])
+    confidence = average_confidence("decisions_made")
+    return confidence if confidence is not None else 0.5
 
 def count_pending_insights():
     """Conta insights pendentes de implementação"""
     # Simulação - em produção, verificaria status de implementação
-    return len(TREE_MEMORY["insights_generated"]) % 5
+    return count_records("insights_generated") % 5
 
 def process_learning_content(learning_type, content, context):
     """Processa conteúdo de aprendizado e extrai insights"""
@@ -444,8 +462,8 @@ def process_system_evolution(evolution_type, focus_areas):
 
 def calculate_knowledge_base_size():
     """Calcula o tamanho da base de conhecimento"""
-    base_size = len(str(TREE_MEMORY["knowledge_base"]))
-    learning_additions = len(TREE_MEMORY["learning_sessions"]) * 500
+    base_size = len(str(TREE_KNOWLEDGE_BASE))
+    learning_additions = count_records("learning_sessions") * 500
     return base_size + learning_additions
 
 def get_recent_activity():
@@ -453,14 +471,14 @@ def get_recent_activity():
     recent_activity = []
     
     # Últimas 5 atividades de cada tipo
-    for session in TREE_MEMORY["learning_sessions"][-3:]:
+    for session in latest_records("learning_sessions", 3):
         recent_activity.append({
             "type": "learning",
             "description": f"Aprendeu sobre {session['type']}",
             "timestamp": session["timestamp"]
         })
     
-    for decision in TREE_MEMORY["decisions_made"][-3:]:
+    for decision in latest_records("decisions_made", 3):
         recent_activity.append({
             "type": "decision",
             "description": f"Decidiu: {decision['decision_made'][:50]}...",
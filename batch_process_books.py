@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from process_and_clean_book import (
+    HTML_PARSER,
+    file_sha256,
+    process_book_file_with_chapters,
+    save_chapter_index,
+    save_text_to_markdown,
+    stream_pdf_to_markdown
+)
+
+SUPPORTED_EXTENSIONS = ('.html', '.pdf')
+
+# Source hashes of the last successful run, kept next to the outputs
+MANIFEST_NAME = '.ingest_manifest.json'
+
+def output_path_for(input_path, output_dir):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, stem + '.md')
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A broken manifest only costs a full re-run
+        return {}
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+def find_books(input_dir):
+    return sorted(
+        os.path.join(input_dir, name)
+        for name in os.listdir(input_dir)
+        if name.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
+
+def ingest_book(input_path, output_path):
+    # Runs in a worker process; returns what the parent needs for the report and manifest
+    started = time.perf_counter()
+    if input_path.lower().endswith('.pdf'):
+        # Page by page, resuming from a checkpoint left by an interrupted run
+        output_bytes, chapters = stream_pdf_to_markdown(input_path, output_path)
+    else:
+        text, chapters = process_book_file_with_chapters(input_path)
+        save_text_to_markdown(text, output_path)
+        save_chapter_index(text, chapters, output_path)
+        output_bytes = len(text.encode('utf-8'))
+    return {
+        'seconds': time.perf_counter() - started,
+        'output_bytes': output_bytes,
+        'chapters': len(chapters)
+    }
+
+def run_batch(input_dir, output_dir, workers=None, force=False):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+
+    # Hash sources up front so unchanged books never reach the pool
+    pending = {}
+    skipped = 0
+    for input_path in find_books(input_dir):
+        name = os.path.basename(input_path)
+        output_path = output_path_for(input_path, output_dir)
+        sha256 = file_sha256(input_path)
+        entry = manifest.get(name)
+        if not force and entry and entry.get('sha256') == sha256 and os.path.exists(output_path):
+            skipped += 1
+            continue
+        pending[input_path] = (output_path, sha256)
+
+    print(f'{len(pending)} to process, {skipped} unchanged (parser: {HTML_PARSER})')
+    if not pending:
+        return 0
+
+    failures = 0
+    total_bytes = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(ingest_book, input_path, output_path): input_path
+            for input_path, (output_path, _) in pending.items()
+        }
+        for future in as_completed(futures):
+            input_path = futures[future]
+            name = os.path.basename(input_path)
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f'FAILED {name}: {e}', file=sys.stderr)
+                continue
+
+            input_bytes = os.path.getsize(input_path)
+            total_bytes += input_bytes
+            throughput = input_bytes / 1e6 / result['seconds'] if result['seconds'] else 0.0
+            print(
+                f"{name}: {input_bytes / 1e6:.2f} MB in {result['seconds']:.2f}s "
+                f"({throughput:.2f} MB/s, {result['chapters']} chapters)"
+            )
+
+            output_path, sha256 = pending[input_path]
+            manifest[name] = {
+                'sha256': sha256,
+                'output': os.path.basename(output_path),
+                'output_bytes': result['output_bytes'],
+                'chapters': result['chapters']
+            }
+            # Saved after every book so an interrupted run keeps its progress
+            save_manifest(output_dir, manifest)
+
+    elapsed = time.perf_counter() - started
+    print(f'Total: {total_bytes / 1e6:.2f} MB in {elapsed:.2f}s ({total_bytes / 1e6 / elapsed:.2f} MB/s)')
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean every HTML/PDF book in a directory in parallel')
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='reprocess books even if unchanged')
+    args = parser.parse_args()
+
+    failures = run_batch(args.input_dir, args.output_dir, args.workers, args.force)
+    sys.exit(1 if failures else 0)
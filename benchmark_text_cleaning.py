@@ -0,0 +1,78 @@
+import argparse
+import os
+import re
+import time
+import tracemalloc
+
+from process_and_clean_book import CLEAN_CHUNK_SIZE, CLEANING_TABLE, clean_and_normalize, clean_chunks, clean_text, normalize_text
+
+DEFAULT_BOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processed_books')
+
+def legacy_pipeline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return normalize_text(clean_text(text))
+
+def single_pass(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return clean_and_normalize(text)
+
+def streamed(path):
+    # Reads and cleans slice by slice; only the output is accumulated
+    with open(path, 'r', encoding='utf-8') as f:
+        return ''.join(clean_chunks(iter(lambda: f.read(CLEAN_CHUNK_SIZE), ''), CLEANING_TABLE))
+
+PIPELINES = [
+    ('legacy', legacy_pipeline),
+    ('single-pass', single_pass),
+    ('streamed', streamed)
+]
+
+def measure(pipeline, path, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pipeline(path)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Peak memory is measured on a separate run; tracemalloc slows everything down
+    tracemalloc.start()
+    output = pipeline(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, output
+
+def run(books_dir, repeat):
+    names = sorted(name for name in os.listdir(books_dir) if name.endswith('.md'))
+    totals = {label: [0.0, 0] for label, _ in PIPELINES}
+
+    print(f"{'book':40} {'MB':>6} " + ' '.join(f'{label:>24}' for label, _ in PIPELINES))
+    for name in names:
+        path = os.path.join(books_dir, name)
+        size = os.path.getsize(path)
+        cells = []
+        outputs = []
+        for label, pipeline in PIPELINES:
+            seconds, peak, output = measure(pipeline, path, repeat)
+            totals[label][0] += seconds
+            totals[label][1] = max(totals[label][1], peak)
+            outputs.append(output)
+            cells.append(f'{seconds * 1000:8.1f} ms {peak / 1e6:7.1f} MB')
+
+        # The single pass also collapses spaces left behind by removed characters
+        legacy = re.sub(' {2,}', ' ', outputs[0]).strip(' ')
+        same = all(output == legacy for output in outputs[1:])
+        print(f'{name[:40]:40} {size / 1e6:6.2f} ' + ' '.join(f'{cell:>24}' for cell in cells) + ('' if same else '  OUTPUT DIFFERS'))
+
+    print()
+    for label, (seconds, peak) in totals.items():
+        print(f'{label:12} total {seconds:.3f}s, highest peak {peak / 1e6:.1f} MB')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the legacy and single-pass text cleaners')
+    parser.add_argument('books_dir', nargs='?', default=DEFAULT_BOOKS_DIR)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per book (best is kept)')
+    args = parser.parse_args()
+    run(args.books_dir, args.repeat)
@@ -1,6 +1,6 @@
 import os
 from bs4 import BeautifulSoup
-from PyPDF2 import PdfReader
+from process_and_clean_book import iter_pdf_pages
 
 def extract_text_from_html(html_file_path):
     with open(html_file_path, 'r', encoding='utf-8') as f:
@@ -8,12 +8,7 @@ def extract_text_from_html(html_file_path):
         return soup.get_text()
 
 def extract_text_from_pdf(pdf_file_path):
-    text = ''
-    with open(pdf_file_path, 'rb') as f:
-        reader = PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text() or ''
-    return text
+    return ''.join(text for _, text in iter_pdf_pages(pdf_file_path))
 
 def process_book_file(file_path):
     if file_path.endswith('.html'):
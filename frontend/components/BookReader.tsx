@@ -14,22 +14,29 @@ interface Section {
 }
 
 const BookReader: React.FC<BookReaderProps> = ({ bookId, bookTitle, onBack }) => {
-  const [sections, setSections] = useState<Section[]>([]);
+  const [currentSection, setCurrentSection] = useState<Section | null>(null);
   const [currentSectionIndex, setCurrentSectionIndex] = useState<number>(0);
+  const [totalSections, setTotalSections] = useState<number>(0);
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
-    const fetchBookContent = async () => {
+    setCurrentSectionIndex(0);
+  }, [bookId]);
+
+  useEffect(() => {
+    const fetchSection = async () => {
       try {
         setLoading(true);
-        const response = await fetch(`/api/library/${bookId}/content`);
+        // Busca apenas a seção exibida, em vez do livro inteiro
+        const response = await fetch(`/api/library/${bookId}/sections/${currentSectionIndex + 1}`);
         if (!response.ok) {
           throw new Error(`HTTP error! status: ${response.status}`);
         }
         const data = await response.json();
-        if (data.success && data.book && data.book.sections) {
-          setSections(data.book.sections);
+        if (data.success && data.section) {
+          setCurrentSection(data.section);
+          setTotalSections(data.total_sections);
         } else {
           setError('Formato de dados do livro inválido.');
         }
@@ -42,14 +49,12 @@ const BookReader: React.FC<BookReaderProps> = ({ bookId, bookTitle, onBack }) =>
     };
 
     if (bookId) {
-      fetchBookContent();
+      fetchSection();
     }
-  }, [bookId]);
-
-  const currentSection = sections[currentSectionIndex];
+  }, [bookId, currentSectionIndex]);
 
   const handleNextSection = () => {
-    if (currentSectionIndex < sections.length - 1) {
+    if (currentSectionIndex < totalSections - 1) {
       setCurrentSectionIndex(currentSectionIndex + 1);
     }
   };
@@ -90,11 +95,11 @@ const BookReader: React.FC<BookReaderProps> = ({ bookId, bookTitle, onBack }) =>
           Anterior
         </button>
         <span className="text-gray-600 py-2 px-4">
-          Seção {currentSectionIndex + 1} de {sections.length}
+          Seção {currentSectionIndex + 1} de {totalSections}
         </span>
         <button
           onClick={handleNextSection}
-          disabled={currentSectionIndex === sections.length - 1}
+          disabled={currentSectionIndex === totalSections - 1}
           className="bg-green-600 hover:bg-green-700 text-white font-bold py-2 px-4 rounded-r-lg disabled:opacity-50"
         >
           Próxima
@@ -1,6 +1,11 @@
 
 
 
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
 import os
 import re
 import sys
@@ -8,8 +13,22 @@ from bs4 import BeautifulSoup, Comment
 from PyPDF2 import PdfReader
 import unicodedata
 
+# Marker placed before each heading, before cleaning flattens the line breaks
+CHAPTER_MARK = '\x1e'
+
+# Chapter heading on its own line of raw text (PDF)
+HEADING_LINE = re.compile(
+    r'^[ \t]*(?:chapter|cap[ií]tulo)\s+(?:[ivxlcdm]+|\d+)\b.*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+PARAGRAPH_SEPARATOR = '\n\n'
+
+# lxml builds the tree in C; fall back to the pure-Python parser when it is missing
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
 def clean_html_book(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = BeautifulSoup(html_content, HTML_PARSER)
 
     # Remove Project Gutenberg boilerplate
     for section_id in ['pg-header', 'pg-footer']:
@@ -25,6 +44,11 @@ def clean_html_book(html_content):
     for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
         comment.extract()
 
+    # Mark chapter headings so they survive whitespace flattening
+    for heading in soup.find_all(['h1', 'h2', 'h3']):
+        heading.insert_before(CHAPTER_MARK)
+        heading.insert_after('\n')
+
     # Extract main content
     body_content = soup.find('body')
     if body_content:
@@ -33,13 +57,15 @@ def clean_html_book(html_content):
         return body_content.get_text()
     return soup.get_text()
 
-def extract_text_from_pdf(pdf_file_path):
-    text = ''
+def iter_pdf_pages(pdf_file_path, start_page=0):
+    # Yields (page_number, text) one page at a time; only the current page is held
     with open(pdf_file_path, 'rb') as f:
         reader = PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text() or ''
-    return text
+        for page_number in range(start_page, len(reader.pages)):
+            yield page_number, reader.pages[page_number].extract_text() or ''
+
+def extract_text_from_pdf(pdf_file_path):
+    return ''.join(text for _, text in iter_pdf_pages(pdf_file_path))
 
 def clean_text(text):
     # Remove multiple spaces, newlines, and tabs
@@ -55,25 +81,272 @@ def normalize_text(text):
     text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8')
     return text
 
-def process_book_file(file_path):
-    raw_text = ''
+# Characters kept by clean_text, before lowercasing and accent removal
+KEPT_CHARACTER = re.compile(r'[\w.,!?;:()\[\]-]')
+# The display text also keeps quotes, apostrophes, dashes and ellipses
+DISPLAY_CHARACTER = re.compile(r'[\w.,!?;:()\[\]\-\'"‘’“”«»–—…]')
+WHITESPACE = re.compile(r'\s')
+SPACE_RUN = re.compile(r' {2,}')
+
+# Size of the slices fed to the cleaner, so no full-size copy of a book is made
+CLEAN_CHUNK_SIZE = 1 << 20
+
+class CleaningTable(dict):
+    """
+    str.translate table doing the whole cleaning in one pass
+
+    Each character is mapped the first time it is seen and cached:
+    whitespace becomes a space and characters outside `kept` disappear.
+    With fold=True the rest is lowercased with its accents dropped, which
+    is clean_text and normalize_text combined; otherwise it is kept as is.
+    """
+
+    def __init__(self, kept=KEPT_CHARACTER, fold=True):
+        super().__init__()
+        self.kept = kept
+        self.fold = fold
+
+    def __missing__(self, codepoint):
+        character = chr(codepoint)
+        if WHITESPACE.match(character):
+            mapped = ' '
+        elif not self.kept.match(character):
+            mapped = ''
+        elif self.fold:
+            mapped = unicodedata.normalize('NFKD', character.lower()).encode('ascii', 'ignore').decode('ascii')
+        else:
+            mapped = character
+        self[codepoint] = mapped
+        return mapped
+
+# Legacy output: lowercase ASCII
+CLEANING_TABLE = CleaningTable()
+
+# Stored books: accents and case intact; the backend search index folds them
+DISPLAY_TABLE = CleaningTable(DISPLAY_CHARACTER, fold=False)
+
+def iter_slices(text, size=CLEAN_CHUNK_SIZE):
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        # Never separate a letter from its combining accent
+        while start + 1 < end < len(text) and unicodedata.combining(text[end]):
+            end -= 1
+        yield text[start:end]
+        start = end
+
+def clean_chunks(chunks, table=DISPLAY_TABLE):
+    """
+    Cleans streamed text with a CleaningTable, yielding the cleaned pieces
+
+    Accents are composed first (NFC) so that decomposed letters keep them.
+    Whitespace runs are collapsed across chunk boundaries and the result is
+    stripped, like clean_text on the whole text.
+    """
+    started = False
+    pending_space = False
+    for chunk in chunks:
+        text = SPACE_RUN.sub(' ', unicodedata.normalize('NFC', chunk).translate(table))
+        core = text.strip(' ')
+        if not core:
+            pending_space = pending_space or (started and bool(text))
+            continue
+        if started and (pending_space or text[0] == ' '):
+            yield ' '
+        yield core
+        started = True
+        pending_space = text[-1] == ' '
+
+def clean_and_normalize(text):
+    return ''.join(clean_chunks(iter_slices(text), CLEANING_TABLE))
+
+def clean_for_display(text):
+    return ''.join(clean_chunks(iter_slices(text), DISPLAY_TABLE))
+
+def mark_heading_lines(text):
+    # Heading lines only exist before cleaning collapses newlines
+    return HEADING_LINE.sub(lambda match: CHAPTER_MARK + match.group(0), text)
+
+def heading_title(chunk):
+    first_line = chunk.strip().split('\n', 1)[0]
+    return ' '.join(first_line.split())[:120]
+
+def split_into_chapters(raw_text):
+    # Yields (title, raw chunk); the text before the first heading has no title
+    chunks = raw_text.split(CHAPTER_MARK)
+    yield None, chunks[0]
+    for chunk in chunks[1:]:
+        yield heading_title(chunk), chunk
+
+class CleanTextWriter:
+    """
+    Cleans raw text piece by piece and writes it to a binary stream
+
+    Pieces of the same chapter are joined by a space and chapters by a blank
+    line. Chapter starts are recorded as UTF-8 byte offsets in the output.
+    """
+
+    def __init__(self, stream, byte_offset=0, chapters=None, pending_title=None, chapter_break=False):
+        self.stream = stream
+        self.byte_offset = byte_offset
+        self.chapters = chapters if chapters is not None else []
+        self.pending_title = pending_title
+        self.chapter_break = chapter_break
+
+    def start_chapter(self, title):
+        # Takes effect at the next non-empty piece, so empty chapters leave no entry
+        self.pending_title = title
+        self.chapter_break = True
+
+    def write(self, raw_text):
+        # Cleaned pieces go straight to the stream; the separator and chapter
+        # entry wait for the first non-empty piece
+        pieces = clean_chunks(iter_slices(raw_text))
+        first_piece = next(pieces, None)
+        if first_piece is None:
+            return
+        if self.byte_offset:
+            separator = PARAGRAPH_SEPARATOR if self.chapter_break else ' '
+            self.stream.write(separator.encode('utf-8'))
+            self.byte_offset += len(separator)
+        if self.pending_title:
+            self.chapters.append({'title': self.pending_title, 'byte_start': self.byte_offset})
+        self.pending_title = None
+        self.chapter_break = False
+
+        for piece in itertools.chain((first_piece,), pieces):
+            data = piece.encode('utf-8')
+            self.stream.write(data)
+            self.byte_offset += len(data)
+
+    def write_marked(self, raw_text):
+        # Text where each CHAPTER_MARK opens a chapter titled by its first line
+        chunks = raw_text.split(CHAPTER_MARK)
+        self.write(chunks[0])
+        for chunk in chunks[1:]:
+            self.start_chapter(heading_title(chunk))
+            self.write(chunk)
+
+    def state(self):
+        return {
+            'byte_offset': self.byte_offset,
+            'chapters': self.chapters,
+            'pending_title': self.pending_title,
+            'chapter_break': self.chapter_break
+        }
+
+def process_book_file_with_chapters(file_path):
+    buffer = io.BytesIO()
+    writer = CleanTextWriter(buffer)
     if file_path.endswith('.html'):
         with open(file_path, 'r', encoding='utf-8') as f:
             html_content = f.read()
-        raw_text = clean_html_book(html_content)
+        writer.write_marked(clean_html_book(html_content))
     elif file_path.endswith('.pdf'):
-        raw_text = extract_text_from_pdf(file_path)
+        for _, page_text in iter_pdf_pages(file_path):
+            writer.write_marked(mark_heading_lines(page_text))
     else:
-        return 'Unsupported file type'
+        return 'Unsupported file type', []
+    return buffer.getvalue().decode('utf-8'), writer.chapters
+
+def process_book_file(file_path):
+    text, _ = process_book_file_with_chapters(file_path)
+    return text
+
+def checkpoint_path(output_file_path):
+    return output_file_path + '.checkpoint.json'
 
-    cleaned_text = clean_text(raw_text)
-    normalized_text = normalize_text(cleaned_text)
-    return normalized_text
+def load_checkpoint(output_file_path, source_sha256):
+    path = checkpoint_path(output_file_path)
+    if not os.path.exists(path) or not os.path.exists(output_file_path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A checkpoint from another version of the PDF cannot be resumed
+    if checkpoint.get('source_sha256') != source_sha256:
+        return None
+    if os.path.getsize(output_file_path) < checkpoint['byte_offset']:
+        return None
+    return checkpoint
+
+def save_checkpoint(output_file_path, checkpoint):
+    path = checkpoint_path(output_file_path)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def stream_pdf_to_markdown(pdf_file_path, output_file_path):
+    """
+    Extracts, cleans and writes a PDF one page at a time
+
+    After each page the output is flushed and the last completed page is saved
+    to <output>.checkpoint.json, so an interrupted run resumes from there.
+    Returns (output bytes, chapters).
+    """
+    source_sha256 = file_sha256(pdf_file_path)
+    checkpoint = load_checkpoint(output_file_path, source_sha256)
+
+    if checkpoint:
+        output = open(output_file_path, 'r+b')
+        # Drops anything written after the last completed page
+        output.truncate(checkpoint['byte_offset'])
+        output.seek(checkpoint['byte_offset'])
+        start_page = checkpoint['next_page']
+        writer = CleanTextWriter(
+            output,
+            checkpoint['byte_offset'],
+            checkpoint['chapters'],
+            checkpoint['pending_title'],
+            checkpoint['chapter_break']
+        )
+    else:
+        output = open(output_file_path, 'wb')
+        start_page = 0
+        writer = CleanTextWriter(output)
+
+    with output:
+        for page_number, page_text in iter_pdf_pages(pdf_file_path, start_page):
+            writer.write_marked(mark_heading_lines(page_text))
+            output.flush()
+            save_checkpoint(output_file_path, dict(writer.state(), source_sha256=source_sha256, next_page=page_number + 1))
+
+    write_chapter_index(file_sha256(output_file_path), writer.chapters, output_file_path)
+    # Finished: the next run starts from scratch
+    if os.path.exists(checkpoint_path(output_file_path)):
+        os.remove(checkpoint_path(output_file_path))
+    return writer.byte_offset, writer.chapters
 
 def save_text_to_markdown(text, output_file_path):
     with open(output_file_path, 'w', encoding='utf-8') as f:
         f.write(text)
 
+def chapter_index_path(output_file_path):
+    # Read by the backend book index as <book_id>.chapters.json
+    return os.path.splitext(output_file_path)[0] + '.chapters.json'
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def save_chapter_index(text, chapters, output_file_path):
+    write_chapter_index(hashlib.sha256(text.encode('utf-8')).hexdigest(), chapters, output_file_path)
+
+def write_chapter_index(sha256, chapters, output_file_path):
+    # The hash ties the index to this exact output; the backend ignores stale indexes
+    chapter_index = {
+        'sha256': sha256,
+        'chapters': chapters
+    }
+    with open(chapter_index_path(output_file_path), 'w', encoding='utf-8') as f:
+        json.dump(chapter_index, f, ensure_ascii=False, indent=2)
+
 if __name__ == '__main__':
     if len(sys.argv) != 3:
         print("Usage: python process_and_clean_book.py <input_file> <output_file>")
@@ -82,8 +355,12 @@ if __name__ == '__main__':
     input_file = sys.argv[1]
     output_file = sys.argv[2]
 
-    processed_text = process_book_file(input_file)
-    save_text_to_markdown(processed_text, output_file)
+    if input_file.endswith('.pdf'):
+        stream_pdf_to_markdown(input_file, output_file)
+    else:
+        processed_text, chapters = process_book_file_with_chapters(input_file)
+        save_text_to_markdown(processed_text, output_file)
+        save_chapter_index(processed_text, chapters, output_file)
 
     print(f'Successfully processed {input_file} and saved to {output_file}')
 